@@ -1,4 +1,5 @@
 from .abstract import AbstractChart, Window
 from .chart import Chart
-from .widgets import JupyterChart
+from .widgets import JupyterChart, RecordingChart, NullWindow
 from .polygon import PolygonChart
+from .server import ServerChart
@@ -1,24 +1,91 @@
 import asyncio
 import json
+import itertools
 import os
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor, TimeoutError as FutureTimeout
 from base64 import b64decode
 from datetime import datetime
-from typing import Callable, Union, Literal, List, Optional
+from time import monotonic, sleep
+from typing import Callable, Dict, Union, Literal, List, Optional
+import numpy as np
 import pandas as pd
 
 from .table import Table
 from .toolbox import ToolBox
 from .drawings import Box, HorizontalLine, RayLine, TrendLine, TwoPointDrawing, VerticalLine, VerticalSpan
+from .store import BarStore, TickAggregator
+from .timeframes import Timeframes
 from .topbar import TopBar
 from .util import (
     BulkRunScript, Pane, Events, IDGen, as_enum, jbool, js_json, TIME, NUM, FLOAT,
     LINE_STYLE, MARKER_POSITION, MARKER_SHAPE, CROSSHAIR_MODE,
-    PRICE_SCALE_MODE, marker_position, marker_shape, js_data,
+    PRICE_SCALE_MODE, marker_position, marker_shape, js_data, as_frame,
 )
 
 current_dir = os.path.dirname(os.path.abspath(__file__))
 INDEX = os.path.join(current_dir, 'js', 'index.html')
 
+# Registered once in each window and called by index with `Window.run_command`,
+# so that frequent calls send only their arguments rather than a script of their own.
+COMMANDS = {
+    'update': '(target, data) => target.series.update(data)',
+    'update_volume': '(target, data) => target.volumeSeries.update(data)',
+    'update_points': '(target, points) => target.updatePoints(points)',
+    'set_text': '(target, text) => { target.innerText = text }',
+    'set_section_text': '(target, section, index, text) => { target[section][index].innerText = text }',
+    'update_cell': '(target, row, column, value) => target.updateCell(row, column, value)',
+}
+_COMMAND_INDEX = {name: i for i, name in enumerate(COMMANDS)}
+
+# Events are sent to Python with `lwcEmit(name, args, coalesce)`: queued and sent together once per frame
+# as JSON, with coalesced events only keeping their latest arguments. `lwcEvents.rates` holds the
+# throttle or debounce (in milliseconds) of each event.
+EVENTS_SCRIPT = '''
+    window.lwcEvents = {queue: [], rates: {}, last: {}, timers: {}, pending: {}, flushing: false}
+    window.lwcQueue = (name, args, coalesce) => {
+        const events = window.lwcEvents
+        const index = coalesce ? events.queue.findIndex((event) => event[0] === name) : -1
+        if (index === -1) events.queue.push([name, args])
+        else events.queue[index][1] = args
+        if (events.flushing) return
+        events.flushing = true;
+        (document.hidden ? setTimeout : requestAnimationFrame)(() => {
+            const queue = events.queue
+            events.queue = []
+            events.flushing = false
+            window.callbackFunction(JSON.stringify(queue))
+        })
+    }
+    window.lwcEmit = (name, args, coalesce = false) => {
+        const events = window.lwcEvents, rate = events.rates[name]
+        if (!rate) return window.lwcQueue(name, args, coalesce)
+        events.pending[name] = args
+        if (rate.debounce) clearTimeout(events.timers[name])
+        else if (events.timers[name]) return
+        const wait = rate.debounce || Math.max(0, (events.last[name] || 0) + rate.throttle - Date.now())
+        events.timers[name] = setTimeout(() => {
+            events.timers[name] = null
+            events.last[name] = Date.now()
+            window.lwcQueue(name, events.pending[name], coalesce)
+        }, wait)
+    }
+'''
+
+
+def _json_default(o):
+    return o.to_dict() if isinstance(o, pd.Series) else o.item()
+
+
+def superseded_keys(keys, key) -> list:
+    """
+    The keys of `keys` whose scripts a script of `key` makes redundant: its own key, and if it sets the data
+    of a series (`(target, 'setData')`), those changing the data set before (`(target, 'update', ...)`).
+    """
+    if key[1:] != ('setData',):
+        return [key] if key in keys else []
+    return [other for other in keys if other == key or (isinstance(other, tuple) and other[:2] == (key[0], 'update'))]
+
 
 class Window:
     _id_gen = IDGen()
@@ -28,17 +95,44 @@ class Window:
         self,
         script_func: Optional[Callable] = None,
         js_api_code: Optional[str] = None,
-        run_script: Optional[Callable] = None
+        run_script: Optional[Callable] = None,
+        schedule_func: Optional[Callable] = None,
+        script_keys: bool = False
     ):
         self.loaded = False
+        self.binary = False
         self.script_func = script_func
         self.scripts = []
         self.final_scripts = []
+        # the index in `scripts` of the last script of each key, which a later script of that key replaces
+        self._journal: Dict[tuple, int] = {}
         self.bulk_run = BulkRunScript(script_func)
 
+        self._update_interval = None
+        self._pending_updates = {}
+        self._updates_scheduled = False
+        self._batch = None
+        self._batch_size = 0
+        self._batch_started = 0.0
+        self._batch_max_bytes = 0
+        self._batch_max_delay = 0.0
+        self._lock = threading.RLock()
+        # calls a function after a delay in seconds, on the thread script_func must be called from
+        self._schedule_func = schedule_func
+        # script_func takes the key of a script as a second argument, so stale updates can be dropped
+        self._script_keys = script_keys
+
         if run_script:
             self.run_script = run_script
 
+        if script_func is None and run_script is None:
+            return
+        self.run_script(f'''
+            window.lwcCommands = [{', '.join(COMMANDS.values())}]
+            window.lwc = (op, target, ...args) => window.lwcCommands[op](window[target], ...args)
+            {EVENTS_SCRIPT}
+        ''')
+
         if js_api_code:
             self.run_script(f'window.callbackFunction = {js_api_code}')
 
@@ -47,35 +141,197 @@ class Window:
             return
         self.loaded = True
 
-        if hasattr(self, '_return_q'):
-            while not self.run_script_and_get('document.readyState == "complete"'):
-                continue    # scary, but works
+        if getattr(self, '_return_q', None) is not None:
+            self._wait_for_document()
 
-        initial_script = ''
         self.scripts.extend(self.final_scripts)
-        for script in self.scripts:
-            initial_script += f'\n{script}'
-        self.script_func(initial_script)
+        self._journal.clear()
+        self.script_func('\n'.join(script for script in self.scripts if script))
 
-    def run_script(self, script: str, run_last: bool = False):
+    def _wait_for_document(self, timeout: float = 1.0):
+        # asks again on a backoff, rather than in a busy loop, until the document has loaded
+        delay = 0.005
+        while True:
+            try:
+                if self.run_script_and_get('document.readyState == "complete"', timeout):
+                    return
+            except FutureTimeout:
+                pass
+            sleep(delay)
+            delay = min(delay * 2, 0.1)
+
+    def run_script(self, script: str, run_last: bool = False, key: Optional[tuple] = None):
         """
         For advanced users; evaluates JavaScript within the Webview.
         """
         if self.script_func is None:
             raise AttributeError("script_func has not been set")
         if self.loaded:
-            if self.bulk_run.enabled:
-                self.bulk_run.add_script(script)
-            else:
-                self.script_func(script)
+            if not self._update_interval and not self._pending_updates:
+                self._send(script, key)
+                return
+            with self._lock:
+                if key is not None and self._update_interval:
+                    # moved to the end, as the script may depend on the scripts since the one it replaces
+                    for superseded in superseded_keys(self._pending_updates, key):
+                        del self._pending_updates[superseded]
+                    self._pending_updates[key] = script
+                    self._schedule_updates()
+                    return
+                self.flush_updates()
+                self._send(script)
         elif run_last:
             self.final_scripts.append(script)
         else:
+            if key is not None:
+                for superseded in superseded_keys(self._journal, key):
+                    self.scripts[self._journal.pop(superseded)] = ''
+                self._journal[key] = len(self.scripts)
             self.scripts.append(script)
 
-    def run_script_and_get(self, script: str):
-        self.run_script(f'_~_~RETURN~_~_{script}')
-        return self._return_q.get()
+    def run_command(self, name: str, target: str, *args, key: Optional[tuple] = None):
+        """
+        Calls the command `name` of `COMMANDS` on the object with the id `target`.
+        """
+        arguments = ','.join(json.dumps(arg, separators=(',', ':'), default=_json_default) for arg in args)
+        self.run_script(f'lwc({_COMMAND_INDEX[name]},"{target.partition(".")[2]}",{arguments})', key=key)
+
+    def _send(self, script: str, key: Optional[tuple] = None):
+        if self.bulk_run.enabled:
+            self.bulk_run.add_script(script)
+        elif self._batch is not None:
+            self._add_to_batch(script)
+        elif key is not None and self._script_keys:
+            self.script_func(script, key)
+        else:
+            self.script_func(script)
+
+    def auto_batch(self, enabled: bool = True, max_bytes: int = 1_000_000, max_delay: float = 0.01):
+        """
+        Buffers scripts, sending them as one script at the end of the current iteration of the event loop
+        (or after `max_delay` seconds when there is no event loop), or once `max_bytes` are buffered.
+        """
+        with self._lock:
+            self.flush_batch()
+            self._batch = [] if enabled else None
+            self._batch_max_bytes, self._batch_max_delay = max_bytes, max_delay
+
+    def flush_batch(self):
+        """
+        Sends any scripts buffered by `auto_batch`.
+        """
+        with self._lock:
+            if not self._batch:
+                return
+            script = '\n'.join(self._batch)
+            self._batch.clear()
+            self._batch_size = 0
+            self.script_func(script)
+
+    def _add_to_batch(self, script: str):
+        with self._lock:
+            if not self._batch:
+                self._batch_started = monotonic()
+                self._schedule_batch()
+            self._batch.append(script)
+            self._batch_size += len(script)
+            if (self._batch_size >= self._batch_max_bytes
+                    or monotonic() - self._batch_started >= self._batch_max_delay):
+                self.flush_batch()
+
+    def _schedule_batch(self):
+        if self._schedule_func:
+            self._schedule_func(0, self.flush_batch)
+            return
+        try:
+            asyncio.get_running_loop().call_soon(self.flush_batch)
+        except RuntimeError:
+            timer = threading.Timer(self._batch_max_delay, self.flush_batch)
+            timer.daemon = True
+            timer.start()
+
+    def set_update_rate(self, hz: Optional[float] = None):
+        """
+        Coalesces updates to the same target (a bar of a series, a horizontal line, a textbox etc.),
+        sending only the latest of each, at most `hz` times per second. `None` sends every update immediately.
+        """
+        self.flush_updates()
+        self._update_interval = 1 / hz if hz else None
+
+    def flush_updates(self):
+        """
+        Sends any updates held back by `set_update_rate` as a single script.
+        """
+        with self._lock:
+            self._updates_scheduled = False
+            if not self._pending_updates:
+                return
+            script = '\n'.join(self._pending_updates.values())
+            self._pending_updates.clear()
+            self._send(script)
+
+    def _schedule_updates(self):
+        if self._updates_scheduled:
+            return
+        self._updates_scheduled = True
+        if self._schedule_func:
+            self._schedule_func(self._update_interval, self.flush_updates)
+            return
+        try:
+            asyncio.get_running_loop().call_later(self._update_interval, self.flush_updates)
+        except RuntimeError:
+            # only used by backends whose script_func can be called from any thread
+            timer = threading.Timer(self._update_interval, self.flush_updates)
+            timer.daemon = True
+            timer.start()
+
+    def run_script_and_get(self, script: str, timeout: Optional[float] = None):
+        """
+        Evaluates JavaScript within the Webview, blocking until its value is returned.
+        """
+        return self._request(script).result(timeout)
+
+    async def run_script_and_get_async(self, script: str):
+        """
+        Evaluates JavaScript within the Webview, without blocking the event loop while waiting for its value.
+        """
+        return await asyncio.wrap_future(self._request(script))
+
+    _request_ids = itertools.count()
+    _responses: Dict[int, Future] = {}
+    _response_thread: Optional[threading.Thread] = None
+
+    def _request(self, script: str) -> Future:
+        # responses from every window share _return_q, so each request is tagged with an id
+        future, request_id = Future(), next(Window._request_ids)
+        Window._responses[request_id] = future
+        self._start_response_thread()
+        script = f'_~_~RETURN~_~_{request_id}_~_{script}'
+        if self.loaded:
+            # anything sent before must run first, and the script can't be part of a batch
+            self.flush_updates()
+            self.flush_batch()
+            self.script_func(script)
+        else:
+            self.run_script(script)
+        return future
+
+    def _start_response_thread(self):
+        thread = Window._response_thread
+        if thread and thread.is_alive() and thread.queue is self._return_q:
+            return
+        thread = Window._response_thread = threading.Thread(
+            target=self._resolve_responses, args=(self._return_q,), daemon=True)
+        thread.queue = self._return_q
+        thread.start()
+
+    @staticmethod
+    def _resolve_responses(queue):
+        while (response := queue.get()) is not None:
+            request_id, value = response
+            future = Window._responses.pop(request_id, None)
+            if future is not None:
+                future.set_result(value)
 
     def create_table(
         self,
@@ -151,33 +407,77 @@ class SeriesCommon(Pane):
         self.name = name
         self.num_decimals = 2
         self.offset = 0
-        self.data = pd.DataFrame()
+        self._store = BarStore()
+        self._lod = None
+        self._lod_range = None
         self.markers = {}
 
+    @property
+    def data(self) -> pd.DataFrame:
+        """
+        A read-only, live view of the data, whose last row changes when the last bar is updated.
+        """
+        return self._store.frame()
+
+    _INTERVAL_SAMPLE = 5_000
+
     def _set_interval(self, df: pd.DataFrame):
-        if not pd.api.types.is_datetime64_any_dtype(df['time']):
-            df['time'] = pd.to_datetime(df['time'])
-        common_interval = df['time'].diff().value_counts()
-        if common_interval.empty:
+        """
+        Infers the interval and offset from the head and tail of the data,
+        caching the result on the chart so series set from the same data can reuse it.
+        """
+        times = df['time']
+        if len(times) < 2:
+            return
+        # pre-normalized frames hold epoch seconds rather than datetimes
+        normalized = not pd.api.types.is_datetime64_any_dtype(times)
+        to_nanoseconds = (lambda t: t.to_numpy() * 10 ** 9) if normalized else self._epoch_nanoseconds
+        nanoseconds = to_nanoseconds(times.iloc[[0, -1]])
+        key = (len(times), *nanoseconds.tolist())
+        cached = getattr(self._chart, '_interval_cache', None)
+        if cached and cached[0] == key:
+            self._interval, self.offset = cached[1:]
             return
-        self._interval = common_interval.index[0].total_seconds()
 
+        n = self._INTERVAL_SAMPLE
+        sample = times if len(times) <= 2 * n else pd.concat([times.iloc[:n], times.iloc[-n:]])
+        if not normalized and sample.dt.tz is not None:
+            sample = sample.dt.tz_localize(None)
+        sample = to_nanoseconds(sample)
+        diffs = np.diff(sample) if len(times) <= 2 * n else np.r_[np.diff(sample[:n]), np.diff(sample[n:])]
+        self._interval = float(self._mode(diffs)) / 10 ** 9
+
+        days = sample.astype('datetime64[ns]')
         units = [
-            pd.Timedelta(microseconds=df['time'].dt.microsecond.value_counts().index[0]),
-            pd.Timedelta(seconds=df['time'].dt.second.value_counts().index[0]),
-            pd.Timedelta(minutes=df['time'].dt.minute.value_counts().index[0]),
-            pd.Timedelta(hours=df['time'].dt.hour.value_counts().index[0]),
-            pd.Timedelta(days=df['time'].dt.day.value_counts().index[0]),
+            (sample // 10 ** 3) % 10 ** 6 * 10 ** 3,
+            (sample // 10 ** 9) % 60 * 10 ** 9,
+            (sample // (60 * 10 ** 9)) % 60 * 60 * 10 ** 9,
+            (sample // (3600 * 10 ** 9)) % 24 * 3600 * 10 ** 9,
+            ((days.astype('datetime64[D]') - days.astype('datetime64[M]')).astype('int64') + 1) * 86400 * 10 ** 9,
         ]
         self.offset = 0
         for value in units:
-            value = value.total_seconds()
+            value = float(self._mode(value)) / 10 ** 9
             if value == 0:
                 continue
             elif value >= self._interval:
                 break
             self.offset = value
             break
+        self._chart._interval_cache = (key, self._interval, self.offset)
+
+    @staticmethod
+    def _mode(values: np.ndarray):
+        values, counts = np.unique(values, return_counts=True)
+        return values[np.argmax(counts)]
+
+    def _set_explicit_interval(self, interval, offset=None):
+        def seconds(value):
+            if pd.api.types.is_number(value) and not isinstance(value, (bool, np.bool_)):
+                return float(value)
+            return pd.Timedelta(value).total_seconds()
+        self._interval = seconds(interval)
+        self.offset = seconds(offset) if offset else 0
 
     @staticmethod
     def _format_labels(data, labels, index, exclude_lowercase):
@@ -194,15 +494,77 @@ class SeriesCommon(Pane):
             labels = [*labels, 'time']
         return labels
 
-    def _df_datetime_format(self, df: pd.DataFrame, exclude_lowercase=None):
+    @staticmethod
+    def _is_epoch_seconds(times: pd.Series) -> bool:
+        """
+        Integer times are taken as epoch seconds, unless they are large enough to be nanoseconds.
+        Only the first and last times are checked.
+        """
+        if not pd.api.types.is_integer_dtype(times) or times.empty:
+            return False
+        return abs(times.iloc[[0, -1]]).max() < 10 ** 11
+
+    def _is_normalized(self, df: pd.DataFrame, exclude_lowercase=None) -> bool:
+        """
+        Whether the frame already has lowercase labels and an int64 'time' column of epoch seconds.
+        """
+        if 'time' not in df.columns or df['time'].dtype != np.int64:
+            return False
+        if not all(isinstance(la, str) and (la == la.lower() or la == exclude_lowercase) for la in df.columns):
+            return False
+        return self._is_epoch_seconds(df['time'])
+
+    def _df_datetime_format(self, df: pd.DataFrame, exclude_lowercase=None, interval=None, offset=None):
+        if not self._is_normalized(df, exclude_lowercase):
+            # only the labels and the time column are replaced, so the other columns needn't be copied
+            df = df.copy(deep=False)
+            df.columns = self._format_labels(df, df.columns, df.index, exclude_lowercase)
+            if self._is_epoch_seconds(df['time']):
+                df['time'] = df['time'].astype('int64')
+            elif not pd.api.types.is_datetime64_any_dtype(df['time']):
+                df['time'] = pd.to_datetime(df['time'])
+        if interval is None:
+            self._set_interval(df)
+        else:
+            self._set_explicit_interval(interval, offset)
+        if pd.api.types.is_datetime64_any_dtype(df['time']):
+            df['time'] = self._epoch_nanoseconds(df['time']) // 10 ** 9
+        return df
+
+    @staticmethod
+    def _epoch_nanoseconds(times: pd.Series) -> np.ndarray:
+        # datetimes may be stored at any resolution (eg. 'us' by default in pandas 3)
+        return times.to_numpy(dtype='datetime64[ns]').astype('int64')
+
+    def _update_nanoseconds(self, times: pd.Series) -> np.ndarray:
+        # numbers are taken as milliseconds, as in _single_datetime_format
+        if not pd.api.types.is_datetime64_any_dtype(times):
+            try:
+                times = pd.to_datetime(times, unit='ms')
+            except ValueError:
+                times = pd.to_datetime(times)
+        return self._epoch_nanoseconds(times)
+
+    def _df_update_format(self, df: pd.DataFrame, exclude_lowercase=None):
         df = df.copy()
         df.columns = self._format_labels(df, df.columns, df.index, exclude_lowercase)
-        self._set_interval(df)
-        if not pd.api.types.is_datetime64_any_dtype(df['time']):
-            df['time'] = pd.to_datetime(df['time'])
-        df['time'] = df['time'].astype('int64') // 10 ** 9
+        seconds = self._update_nanoseconds(df['time']) / 10 ** 9
+        df['time'] = self._interval * (seconds // self._interval) + self.offset
         return df
 
+    @staticmethod
+    def _single_nanoseconds(arg) -> int:
+        # a cheaper _single_datetime_format for the tick path, returning unrounded epoch nanoseconds
+        if isinstance(arg, pd.Timestamp):
+            return arg.value
+        if isinstance(arg, datetime):
+            return pd.Timestamp(arg).value
+        if isinstance(arg, np.datetime64):
+            return int(arg.astype('datetime64[ns]').astype('int64'))
+        if isinstance(arg, (int, float, np.number)):
+            return round(arg * 10 ** 6)
+        return pd.Timestamp(arg).value
+
     def _series_datetime_format(self, series: pd.Series, exclude_lowercase=None):
         series = series.copy()
         series.index = self._format_labels(series, series.index, series.name, exclude_lowercase)
@@ -218,33 +580,78 @@ class SeriesCommon(Pane):
         arg = self._interval * (arg.timestamp() // self._interval)+self.offset
         return arg
 
-    def set(self, df: Optional[pd.DataFrame] = None, format_cols: bool = True):
+    def set(self, df: Optional[pd.DataFrame] = None, format_cols: bool = True,
+            interval: Optional[Union[float, str, pd.Timedelta]] = None,
+            offset: Optional[Union[float, str, pd.Timedelta]] = None, copy: bool = True):
+        df = as_frame(df)
         if df is None or df.empty:
-            self.run_script(f'{self.id}.series.setData([])')
-            self.data = pd.DataFrame()
+            self.run_script(f'{self.id}.series.setData([])', key=(f'{self.id}.series', 'setData'))
+            self._store = BarStore()
+            self._lod_range = None
             return
         if format_cols:
-            df = self._df_datetime_format(df, exclude_lowercase=self.name)
+            df = self._df_datetime_format(df, self.name, interval, offset)
+        elif interval is not None:
+            self._set_explicit_interval(interval, offset)
         if self.name:
             if self.name not in df:
                 raise NameError(f'No column named "{self.name}".')
             df = df.rename(columns={self.name: 'value'})
-        self.data = df.copy()
+        self._store = BarStore.from_frame(df, copy)
         self._last_bar = df.iloc[-1]
-        self.run_script(f'{self.id}.series.setData({js_data(df)}); ')
+        if self._lod and len(df) > self._lod:
+            self._lod_range = (0, len(df))
+            df = self._lod_frame(0, len(df))
+        self.run_script(f'{self.id}.series.setData({js_data(df, self.win.binary)}); ', key=(f'{self.id}.series', 'setData'))
+
+    def _enable_lod(self, points: int):
+        """
+        Sends at most about `points` points of the visible range (and a coarser overview of the rest),
+        re-sending the data from the full resolution store whenever the visible range changes.
+        """
+        self._lod = points
+        self.win.handlers[f'{self.id}_lod'] = lambda start, end: self._show_range(float(start), float(end))
+        self.run_script(f'''
+            lwcEvents.rates["{self.id}_lod"] = {{debounce: 50}}
+            {self.id}.lodHandler = (range) => {{
+                if (range) lwcEmit("{self.id}_lod", [range.from, range.to], true)
+            }}
+            {self._chart.id}.chart.timeScale().subscribeVisibleTimeRangeChange({self.id}.lodHandler)
+        ''')
+
+    def _lod_frame(self, start: int, end: int) -> pd.DataFrame:
+        store, points = self._store, self._lod
+        indices = [store.decimate('value', 0, start, points // 4), store.decimate('value', start, end, points),
+                   store.decimate('value', end, len(store), points // 4)]
+        if end > start:
+            # keeping the edges of the range stops the restored visible range from drifting
+            indices.append([start, end - 1])
+        return store.frame().iloc[np.unique(np.concatenate(indices))]
+
+    def _show_range(self, start_time: float, end_time: float):
+        times = self._store.frame()['time'].to_numpy()
+        if len(times) <= self._lod:
+            return
+        start, end = int(np.searchsorted(times, start_time, 'left')), int(np.searchsorted(times, end_time, 'right'))
+        if (start, end) == self._lod_range:
+            return
+        self._lod_range = (start, end)
+        self.run_script(f'''
+            {self.id}.series.setData({js_data(self._lod_frame(start, end), self.win.binary)})
+            {self._chart.id}.chart.timeScale().setVisibleRange({{from: {start_time}, to: {end_time}}})
+        ''', key=(f'{self.id}.series', 'setData'))
 
     def update(self, series: pd.Series):
         series = self._series_datetime_format(series, exclude_lowercase=self.name)
         if self.name in series.index:
             series.rename({self.name: 'value'}, inplace=True)
-        if self._last_bar is not None and series['time'] != self._last_bar['time']:
-            self.data.loc[self.data.index[-1]] = self._last_bar
-            self.data = pd.concat([self.data, series.to_frame().T], ignore_index=True)
+        self._store.update(series)
         self._last_bar = series
-        self.run_script(f'{self.id}.series.update({js_data(series)})')
+        self.win.run_command('update', self.id, series, key=(f'{self.id}.series', 'update', series['time']))
 
     def _update_markers(self):
-        self.run_script(f'{self.id}.series.setMarkers({json.dumps(list(self.markers.values()))})')
+        self.run_script(f'{self.id}.series.setMarkers({json.dumps(list(self.markers.values()))})',
+                        key=(f'{self.id}.series', 'markers'))
 
     def marker_list(self, markers: list):
         """
@@ -379,7 +786,7 @@ class SeriesCommon(Pane):
             lastValueVisible: {jbool(label_visible)},
             priceLineVisible: {jbool(line_visible)},
             title: '{title}',
-        }})''')
+        }})''', key=(f'{self.id}.series', 'price_line'))
 
     def precision(self, precision: int):
         """
@@ -390,7 +797,7 @@ class SeriesCommon(Pane):
         self.run_script(f'''
         {self.id}.series.applyOptions({{
             priceFormat: {{precision: {precision}, minMove: {min_move}}}
-        }})''')
+        }})''', key=(f'{self.id}.series', 'precision'))
         self.num_decimals = precision
 
     def hide_data(self):
@@ -403,7 +810,7 @@ class SeriesCommon(Pane):
         self.run_script(f'''
         {self.id}.series.applyOptions({{visible: {jbool(arg)}}})
         if ('volumeSeries' in {self.id}) {self.id}.volumeSeries.applyOptions({{visible: {jbool(arg)}}})
-        ''')
+        ''', key=(f'{self.id}.series', 'visible'))
 
     def vertical_span(
         self,
@@ -424,7 +831,8 @@ class SeriesCommon(Pane):
 
 
 class Line(SeriesCommon):
-    def __init__(self, chart, name, color, style, width, price_line, price_label, price_scale_id=None, crosshair_marker=True):
+    def __init__(self, chart, name, color, style, width, price_line, price_label, price_scale_id=None,
+                 crosshair_marker=True, lod_points=None):
 
         super().__init__(chart, name)
         self.color = color
@@ -450,6 +858,8 @@ class Line(SeriesCommon):
                 }}
             )
         null''')
+        if lod_points:
+            self._enable_lod(lod_points)
 
     # def _set_trend(self, start_time, start_value, end_time, end_value, ray=False, round=False):
     #     if round:
@@ -479,6 +889,8 @@ class Line(SeriesCommon):
                 {self._chart.id}.legend.div.removeChild({self.id}legendItem.row)
             }}
 
+            if ({self.id}.lodHandler)
+                {self._chart.id}.chart.timeScale().unsubscribeVisibleTimeRangeChange({self.id}.lodHandler)
             {self._chart.id}.chart.removeSeries({self.id}.series)
             delete {self.id}legendItem
             delete {self.id}
@@ -486,7 +898,8 @@ class Line(SeriesCommon):
 
 
 class Histogram(SeriesCommon):
-    def __init__(self, chart, name, color, price_line, price_label, scale_margin_top, scale_margin_bottom):
+    def __init__(self, chart, name, color, price_line, price_label, scale_margin_top, scale_margin_bottom,
+                 lod_points=None):
         super().__init__(chart, name)
         self.color = color
         self.run_script(f'''
@@ -504,6 +917,8 @@ class Histogram(SeriesCommon):
         {self.id}.series.priceScale().applyOptions({{
             scaleMargins: {{top:{scale_margin_top}, bottom: {scale_margin_bottom}}}
         }})''')
+        if lod_points:
+            self._enable_lod(lod_points)
 
     def delete(self):
         """
@@ -517,6 +932,8 @@ class Histogram(SeriesCommon):
                 {self._chart.id}.legend.div.removeChild({self.id}legendItem.row)
             }}
 
+            if ({self.id}.lodHandler)
+                {self._chart.id}.chart.timeScale().unsubscribeVisibleTimeRangeChange({self.id}.lodHandler)
             {self._chart.id}.chart.removeSeries({self.id}.series)
             delete {self.id}legendItem
             delete {self.id}
@@ -535,37 +952,61 @@ class Candlestick(SeriesCommon):
         self._volume_up_color = 'rgba(83,141,131,0.8)'
         self._volume_down_color = 'rgba(200,127,130,0.8)'
 
-        self.candle_data = pd.DataFrame()
+        self._ticks = TickAggregator()
+
+        self._history_loader = None
+        self._history_next = None
+        self._history_done = False
+        self._history_busy = False
+        # bumped by each prepend, so triggers raised before it are ignored
+        self._history_generation = 0
+        self._history_prefetch = True
+        self._history_executor = None
 
         # self.run_script(f'{self.id}.makeCandlestickSeries()')
 
-    def set(self, df: Optional[pd.DataFrame] = None, keep_drawings=False):
+    @property
+    def candle_data(self) -> pd.DataFrame:
+        """
+        A read-only, live view of the data, whose last row changes when the last bar is updated.
+        """
+        return self._store.frame()
+
+    def set(self, df: Optional[pd.DataFrame] = None, keep_drawings=False,
+            interval: Optional[Union[float, str, pd.Timedelta]] = None,
+            offset: Optional[Union[float, str, pd.Timedelta]] = None, copy: bool = True):
         """
         Sets the initial data for the chart.\n
         :param df: columns: date/time, open, high, low, close, volume (if volume enabled).
+            A NumPy structured array, pyarrow Table/RecordBatch or Polars DataFrame can also be given.
         :param keep_drawings: keeps any drawings made through the toolbox. Otherwise, they will be deleted.
+        :param interval: The bar interval (seconds, or a timedelta string such as '5min'), skipping its inference.
+        :param offset: The offset of bar times from the interval, used with `interval`.
+        :param copy: If False, the retained history shares its arrays with `df` until it is next updated.
         """
+        df = as_frame(df)
+        self._history_next, self._history_done = None, False
         if df is None or df.empty:
-            self.run_script(f'{self.id}.series.setData([])')
-            self.run_script(f'{self.id}.volumeSeries.setData([])')
-            self.candle_data = pd.DataFrame()
+            self.run_script(f'{self.id}.series.setData([])', key=(f'{self.id}.series', 'setData'))
+            self.run_script(f'{self.id}.volumeSeries.setData([])', key=(f'{self.id}.volumeSeries', 'setData'))
+            self._store = BarStore()
+            self._ticks.reset()
             return
-        df = self._df_datetime_format(df)
-        self.candle_data = df.copy()
+        df = self._df_datetime_format(df, interval=interval, offset=offset)
+        self._ticks.reset()
+        self._store = BarStore.from_frame(df, copy)
         self._last_bar = df.iloc[-1]
-        self.run_script(f'{self.id}.series.setData({js_data(df)})')
+        self.run_script(f'{self.id}.series.setData({js_data(df, self.win.binary)})', key=(f'{self.id}.series', 'setData'))
 
         if 'volume' not in df:
             return
-        volume = df.drop(columns=['open', 'high', 'low', 'close']).rename(columns={'volume': 'value'})
-        volume['color'] = self._volume_down_color
-        volume.loc[df['close'] > df['open'], 'color'] = self._volume_up_color
-        self.run_script(f'{self.id}.volumeSeries.setData({js_data(volume)})')
+        self.run_script(f'{self.id}.volumeSeries.setData({js_data(self._volume_columns(df), self.win.binary)})',
+                        key=(f'{self.id}.volumeSeries', 'setData'))
 
         for line in self._lines:
             if line.name not in df.columns:
                 continue
-            line.set(df[['time', line.name]], format_cols=False)
+            line.set(df[['time', line.name]], format_cols=False, interval=self._interval, offset=self.offset, copy=copy)
         # set autoScale to true in case the user has dragged the price scale
         self.run_script(f'''
             if (!{self.id}.chart.priceScale("right").options.autoScale)
@@ -583,19 +1024,87 @@ class Candlestick(SeriesCommon):
         if series['time'] is the same time as the last bar, the last bar will be overwritten.\n
         :param series: labels: date/time, open, high, low, close, volume (if using volume).
         """
-        series = self._series_datetime_format(series) if not _from_tick else series
-        if series['time'] != self._last_bar['time']:
-            self.candle_data.loc[self.candle_data.index[-1]] = self._last_bar
-            self.candle_data = pd.concat([self.candle_data, series.to_frame().T], ignore_index=True)
+        if not _from_tick:
+            series = self._series_datetime_format(series)
+            self._ticks.reset()
+        self._update_bar(series)
+
+    def _update_bar(self, bar):
+        if self._store.update(bar):
             self._chart.events.new_bar._emit(self)
 
-        self._last_bar = series
-        self.run_script(f'{self.id}.series.update({js_data(series)})')
-        if 'volume' not in series:
+        self._last_bar = bar
+        self.win.run_command('update', self.id, bar, key=(f'{self.id}.series', 'update', bar['time']))
+        if 'volume' not in bar:
+            return
+        volume = {
+            'time': bar['time'],
+            'value': bar['volume'],
+            'color': self._volume_up_color if bar['close'] > bar['open'] else self._volume_down_color,
+        }
+        self.win.run_command('update_volume', self.id, volume, key=(f'{self.id}.volumeSeries', 'update', bar['time']))
+
+    def update_many(self, df: pd.DataFrame):
+        """
+        Updates the data from multiple bars within a single script.\n
+        Each bar is handled as in `update`; bars sharing a time overwrite each other.
+        :param df: columns: date/time, open, high, low, close, volume (if using volume).
+        """
+        df = self._df_update_format(df)
+        times, last_bar = df['time'].to_numpy(), self._store.last()
+        if (np.diff(times) < 0).any():
+            raise ValueError('Bars passed to update_many must be sorted by time.')
+        if len(times) and last_bar is not None and times[0] < last_bar['time']:
+            raise ValueError(
+                f'Trying to update bar of time "{pd.to_datetime(times[0], unit="s")}", '
+                f'which occurs before the last bar time of "{pd.to_datetime(last_bar["time"], unit="s")}".')
+        self._ticks.reset()
+        self._update_bars(df.drop_duplicates('time', keep='last'))
+
+    def update_from_ticks(self, df: pd.DataFrame, cumulative_volume: bool = False):
+        """
+        Updates the data from multiple ticks within a single script.\n
+        :param df: columns: date/time, price, volume (if using volume).
+        :param cumulative_volume: Adds the given volume onto the latest bar.
+        """
+        df = df.copy()
+        df.columns = self._format_labels(df, df.columns, df.index, None)
+        self._seed_ticks()
+        bars = self._ticks.add_ticks(
+            self._update_nanoseconds(df['time']),
+            df['price'].to_numpy(dtype=float),
+            df['volume'].to_numpy(dtype=float) if 'volume' in df else None,
+            self._interval, self.offset, cumulative_volume
+        )
+        bars = pd.DataFrame(bars, columns=['time', 'open', 'high', 'low', 'close', 'volume'])
+        if bars['volume'].isna().all():
+            bars = bars.drop(columns='volume')
+        self._update_bars(bars)
+
+    def _update_bars(self, df: pd.DataFrame):
+        if df.empty:
             return
-        volume = series.drop(['open', 'high', 'low', 'close']).rename({'volume': 'value'})
-        volume['color'] = self._volume_up_color if series['close'] > series['open'] else self._volume_down_color
-        self.run_script(f'{self.id}.volumeSeries.update({js_data(volume)})')
+        new_bar = self._chart.events.new_bar
+        if new_bar._callable is None:
+            self._store.update_many(df)
+        else:
+            # commit bar by bar, so that handlers see the data up to each new bar as with `update`
+            for i in range(len(df)):
+                if self._store.update_many(df.iloc[i:i + 1]):
+                    new_bar._emit(self)
+        self._last_bar = df.iloc[-1].copy()
+
+        script = f'for (const bar of {js_data(df)}) {self.id}.series.update(bar)'
+        if 'volume' in df:
+            script += f'\nfor (const bar of {js_data(self._volume_columns(df))}) {self.id}.volumeSeries.update(bar)'
+        self.run_script(script, key=(f'{self.id}.series', 'update', df['time'].iloc[0], df['time'].iloc[-1]))
+
+    def _volume_columns(self, df: pd.DataFrame) -> dict:
+        return {
+            'time': df['time'].to_numpy(),
+            'value': df['volume'].to_numpy(),
+            'color': np.where(df['close'] > df['open'], self._volume_up_color, self._volume_down_color),
+        }
 
     def update_from_tick(self, series: pd.Series, cumulative_volume: bool = False):
         """
@@ -603,27 +1112,138 @@ class Candlestick(SeriesCommon):
         :param series: labels: date/time, price, volume (if using volume).
         :param cumulative_volume: Adds the given volume onto the latest bar.
         """
-        series = self._series_datetime_format(series)
-        if series['time'] < self._last_bar['time']:
-            raise ValueError(f'Trying to update tick of time "{pd.to_datetime(series["time"])}", which occurs before the last bar time of "{pd.to_datetime(self._last_bar["time"])}".')
-        bar = pd.Series(dtype='float64')
-        if series['time'] == self._last_bar['time']:
-            bar = self._last_bar
-            bar['high'] = max(self._last_bar['high'], series['price'])
-            bar['low'] = min(self._last_bar['low'], series['price'])
-            bar['close'] = series['price']
-            if 'volume' in series:
-                if cumulative_volume:
-                    bar['volume'] += series['volume']
-                else:
-                    bar['volume'] = series['volume']
+        tick = {str(key).lower(): value for key, value in series.items()}
+        time = tick['time'] if 'time' in tick else tick['date'] if 'date' in tick else series.name
+        self._seed_ticks()
+        bars = self._ticks.add_tick(
+            self._single_nanoseconds(time), tick['price'], tick.get('volume', np.nan),
+            self._interval, self.offset, cumulative_volume
+        )
+        for bar in bars:
+            bar = dict(zip(('time', 'open', 'high', 'low', 'close', 'volume'), bar))
+            if bar['volume'] != bar['volume']:
+                del bar['volume']
+            self._update_bar(bar)
+
+    def _seed_ticks(self):
+        if self._ticks.time is None and self._last_bar is not None:
+            self._ticks.reset(self._last_bar)
+
+    def set_history_loader(self, loader: Optional[Callable], threshold: int = 100, prefetch: bool = True):
+        """
+        Loads older bars as the chart is scrolled back, instead of all of the history being given to `set`.\n
+        :param loader: Called with the time of the first bar, returning the bars before it (None or an empty frame
+            if there are no more). Can be a coroutine function.
+        :param threshold: Bars are loaded once fewer than this many bars are left of the visible range.
+        :param prefetch: Loads the following page in the background after each page is shown.
+        """
+        self._history_loader, self._history_prefetch = loader, prefetch
+        self._history_next, self._history_done = None, False
+        if loader is None:
+            self.run_script(f'''
+                if ({self.id}.historyHandler)
+                    {self.id}.chart.timeScale().unsubscribeVisibleLogicalRangeChange({self.id}.historyHandler)
+                delete lwcEvents.rates["{self.id}_history"]
+            ''')
+            return
+        if asyncio.iscoroutinefunction(loader):
+            async def handler(bars_before=None, generation=None):
+                if not self._stale_history_trigger(generation):
+                    await self._load_history_async()
         else:
-            for key in ('open', 'high', 'low', 'close'):
-                bar[key] = series['price']
-            bar['time'] = series['time']
-            if 'volume' in series:
-                bar['volume'] = series['volume']
-        self.update(bar, _from_tick=True)
+            def handler(bars_before=None, generation=None):
+                if not self._stale_history_trigger(generation):
+                    self._load_history()
+        self.win.handlers[f'{self.id}_history'] = handler
+        self.run_script(f'''
+            if ({self.id}.historyHandler)
+                {self.id}.chart.timeScale().unsubscribeVisibleLogicalRangeChange({self.id}.historyHandler)
+            {self.id}.historyGeneration = {self._history_generation}
+            lwcEvents.rates["{self.id}_history"] = {{throttle: 100}}
+            {self.id}.historyHandler = (logical) => {{
+                const barsInfo = logical ? {self.id}.series.barsInLogicalRange(logical) : null
+                if (barsInfo && barsInfo.barsBefore < {threshold})
+                    lwcEmit("{self.id}_history", [barsInfo.barsBefore, {self.id}.historyGeneration], true)
+            }}
+            {self.id}.chart.timeScale().subscribeVisibleLogicalRangeChange({self.id}.historyHandler)
+        ''')
+
+    def _stale_history_trigger(self, generation) -> bool:
+        return generation is not None and generation != self._history_generation
+
+    def _history_end(self) -> Optional[pd.Timestamp]:
+        if not len(self._store):
+            return None
+        return pd.Timestamp(self._store.frame()['time'].iloc[0], unit='s')
+
+    def _load_history(self):
+        end = self._history_end()
+        if self._history_busy or self._history_done or end is None:
+            return
+        self._history_busy = True
+        try:
+            if self._history_next and self._history_next[0] == end:
+                page = self._history_next[1].result()
+            else:
+                page = self._history_loader(end)
+            self._history_next = None
+            self._prepend(page)
+            end = self._history_end()
+            if self._history_prefetch and not self._history_done:
+                if self._history_executor is None:
+                    self._history_executor = ThreadPoolExecutor(1)
+                self._history_next = (end, self._history_executor.submit(self._history_loader, end))
+        finally:
+            self._history_busy = False
+
+    async def _load_history_async(self):
+        end = self._history_end()
+        if self._history_busy or self._history_done or end is None:
+            return
+        self._history_busy = True
+        try:
+            if self._history_next and self._history_next[0] == end:
+                page = await self._history_next[1]
+            else:
+                page = await self._history_loader(end)
+            self._history_next = None
+            self._prepend(page)
+            end = self._history_end()
+            if self._history_prefetch and not self._history_done:
+                self._history_next = (end, asyncio.ensure_future(self._history_loader(end)))
+        finally:
+            self._history_busy = False
+
+    def _prepend(self, df):
+        """
+        Adds bars before the first bar, sending only the new bars and keeping the visible bars in view.
+        """
+        df = as_frame(df)
+        if df is None or df.empty:
+            self._history_done = True
+            return
+        df = self._df_datetime_format(df, interval=self._interval, offset=self.offset)
+        df = df[df['time'] < self._store.frame()['time'].iloc[0]]
+        if df.empty:
+            self._history_done = True
+            return
+        self._store = BarStore.from_frame(pd.concat([df, self._store.frame()], ignore_index=True))
+        self._history_generation += 1
+        script = f'''
+            {self.id}.historyGeneration = {self._history_generation}
+            {self.id}.prependRange = {self.id}.chart.timeScale().getVisibleLogicalRange()
+            {self.id}.series.setData({js_data(df, self.win.binary)}.concat({self.id}.series.data()))
+        '''
+        if 'volume' in df:
+            script += f'''
+            {self.id}.volumeSeries.setData({js_data(self._volume_columns(df), self.win.binary)}.concat({self.id}.volumeSeries.data()))
+            '''
+        self.run_script(script + f'''
+            if ({self.id}.prependRange) {self.id}.chart.timeScale().setVisibleLogicalRange({{
+                from: {self.id}.prependRange.from + {len(df)},
+                to: {self.id}.prependRange.to + {len(df)},
+            }})
+        ''', key=(f'{self.id}.series', 'update', 'prepend', df['time'].iloc[0]))
 
     def price_scale(
         self,
@@ -703,6 +1323,7 @@ class AbstractChart(Candlestick, Pane):
 
         from lightweight_charts.polygon import PolygonAPI
         self.polygon: PolygonAPI = PolygonAPI(self)
+        self.timeframes: Timeframes = Timeframes(self)
 
         self.run_script(
             f'{self.id} = new Lib.Handler("{self.id}", {width}, {height}, "{position}", {jbool(autosize)})')
@@ -713,6 +1334,27 @@ class AbstractChart(Candlestick, Pane):
         if toolbox:
             self.toolbox: ToolBox = ToolBox(self)
 
+    def set_update_rate(self, hz: Optional[float] = 30):
+        """
+        Sends only the latest update of each series, line and widget, at most `hz` times per second.
+        This applies to every chart within the window; `None` sends every update immediately.
+        """
+        self.win.set_update_rate(hz)
+
+    def auto_batch(self, enabled: bool = True, max_bytes: int = 1_000_000, max_delay: float = 0.01):
+        """
+        Sends the scripts of each iteration of the event loop as a single script.
+        This applies to every chart within the window.
+        """
+        self.win.auto_batch(enabled, max_bytes, max_delay)
+
+    def binary_transport(self, enabled: bool = True):
+        """
+        Sends data given to `set` as base64 encoded float64 buffers rather than JSON numbers.
+        This applies to every chart within the window.
+        """
+        self.win.binary = enabled
+
     def fit(self):
         """
         Fits the maximum amount of the chart data within the viewport.
@@ -722,25 +1364,30 @@ class AbstractChart(Candlestick, Pane):
     def create_line(
             self, name: str = '', color: str = 'rgba(214, 237, 255, 0.6)',
             style: LINE_STYLE = 'solid', width: int = 2,
-            price_line: bool = True, price_label: bool = True, price_scale_id: Optional[str] = None
+            price_line: bool = True, price_label: bool = True, price_scale_id: Optional[str] = None,
+            lod_points: Optional[int] = None
     ) -> Line:
         """
         Creates and returns a Line object.
+        :param lod_points: If given, only about this many points of the visible range are sent to the chart.
         """
-        self._lines.append(Line(self, name, color, style, width, price_line, price_label, price_scale_id))
+        self._lines.append(Line(self, name, color, style, width, price_line, price_label, price_scale_id,
+                                lod_points=lod_points))
         return self._lines[-1]
 
     def create_histogram(
             self, name: str = '', color: str = 'rgba(214, 237, 255, 0.6)',
             price_line: bool = True, price_label: bool = True,
-            scale_margin_top: float = 0.0, scale_margin_bottom: float = 0.0
+            scale_margin_top: float = 0.0, scale_margin_bottom: float = 0.0,
+            lod_points: Optional[int] = None
     ) -> Histogram:
         """
         Creates and returns a Histogram object.
+        :param lod_points: If given, only about this many points of the visible range are sent to the chart.
         """
         return Histogram(
             self, name, color, price_line, price_label,
-            scale_margin_top, scale_margin_bottom)
+            scale_margin_top, scale_margin_bottom, lod_points)
 
     def lines(self) -> List[Line]:
         """
@@ -811,7 +1458,7 @@ class AbstractChart(Candlestick, Pane):
                    style: {as_enum(style, LINE_STYLE)},
                }},
            }}
-           }})""")
+           }})""", key=(f'{self.id}.chart', 'grid'))
 
     def crosshair(
         self,
@@ -863,7 +1510,7 @@ class AbstractChart(Candlestick, Pane):
                   vertAlign: 'center',
                   ...{js_json(locals())}
               }}
-          }})''')
+          }})''', key=(f'{self.id}.chart', 'watermark'))
 
     def legend(self, visible: bool = False, ohlc: bool = True, percent: bool = True, lines: bool = True,
                color: str = 'rgb(191, 195, 203)', font_size: int = 11, font_family: str = 'Monaco',
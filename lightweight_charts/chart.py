@@ -1,42 +1,152 @@
 import asyncio
 import json
 import multiprocessing as mp
+import queue
+import sys
 import typing
+from collections import deque
+from multiprocessing import resource_tracker
+from multiprocessing.shared_memory import SharedMemory
 import webview
 from webview.errors import JavascriptException
 
 from lightweight_charts import abstract
-from .util import parse_event_message, FLOAT
+from .util import parse_event_messages, FLOAT
 
 import os
 import threading
 
 
 class CallbackAPI:
-    def __init__(self, emit_queue):
-        self.emit_queue = emit_queue
+    def __init__(self, emit_conn, lock=None):
+        self.emit_conn = emit_conn
+        self._lock = lock or threading.Lock()
 
     def callback(self, message: str):
-        self.emit_queue.put(message)
+        # pywebview may call the api from several threads (and processes) at once
+        with self._lock:
+            self.emit_conn.send(message)
+
+
+class SharedMemoryReader:
+    """
+    Reads the scripts placed in shared memory by `WebviewHandler`, handing each segment back once read.
+    """
+    def __init__(self, free_queue):
+        self.free_queue = free_queue
+        self.segments: typing.Dict[str, SharedMemory] = {}
+
+    def read(self, handle) -> str:
+        _, name, size = handle
+        segment = self.segments.get(name)
+        if segment is None:
+            segment = self.segments[name] = self._attach(name)
+        with segment.buf[:size] as view:
+            script = str(view, 'utf-8')
+        self.free_queue.put(name)
+        return script
+
+    @staticmethod
+    def _attach(name) -> SharedMemory:
+        if sys.version_info >= (3, 13):
+            return SharedMemory(name, track=False)
+        segment = SharedMemory(name)
+        if os.name == 'posix':
+            # otherwise the segment is unlinked when this process exits, while the creator still uses it
+            resource_tracker.unregister(segment._name, 'shared_memory')
+        return segment
+
+
+class WindowQueues:
+    """
+    Holds the messages for each window, so that a bulk load in one window does not hold up the others.
+    Window messages are taken in turn, those to be run quickly (small scripts, showing and hiding) first,
+    keeping the order of each window's messages. A keyed script replaces the queued script of the same key,
+    if only keyed scripts have been queued since.
+    """
+    bulk_size = 2 ** 16
+
+    def __init__(self):
+        self._control = deque()
+        self._windows: typing.Dict[int, deque] = {}
+        self._last = -1
+        self._condition = threading.Condition()
+
+    def put(self, message: tuple):
+        with self._condition:
+            if isinstance(message[0], str):
+                self._control.append(message)
+            else:
+                i, arg, key = (*message, None)[:3]
+                lane = self._windows.setdefault(i, deque())
+                if key is not None:
+                    self._drop_stale(lane, key)
+                lane.append((arg, key))
+            self._condition.notify()
+
+    def get(self) -> tuple:
+        with self._condition:
+            while not self._control and not any(self._windows.values()):
+                self._condition.wait()
+            if self._control:
+                return self._control.popleft()
+            # the windows after the one last served come first
+            waiting = sorted((i for i, lane in self._windows.items() if lane), key=lambda i: (i <= self._last, i))
+            i = next((i for i in waiting if self._size(self._windows[i][0][0]) < self.bulk_size), waiting[0])
+            self._last = i
+            return i, self._windows[i].popleft()[0]
+
+    def take_scripts(self, i: int, size: int) -> typing.List[str]:
+        """
+        Takes the plain scripts queued next for window `i`, while their total size (with `size`) fits in a bulk.
+        """
+        scripts = []
+        with self._condition:
+            lane = self._windows.get(i, ())
+            while lane and self._is_script(lane[0][0]) and size + len(lane[0][0]) <= self.bulk_size:
+                size += len(lane[0][0])
+                scripts.append(lane.popleft()[0])
+        return scripts
+
+    @staticmethod
+    def _is_script(arg) -> bool:
+        return isinstance(arg, str) and arg not in ('show', 'hide') and not arg.startswith('_~_~RETURN~_~_')
+
+    @staticmethod
+    def _drop_stale(lane: deque, key):
+        for index in range(len(lane) - 1, -1, -1):
+            arg, queued = lane[index]
+            if queued is None:
+                return
+            if queued == key and isinstance(arg, str):
+                del lane[index]
+                return
+
+    @staticmethod
+    def _size(arg) -> int:
+        return arg[2] if isinstance(arg, tuple) else len(arg)
 
 
 class PyWV:
-    def __init__(self, q, emit_q, return_q, loaded_event):
+    def __init__(self, q, emit_conn, return_q, loaded_event, free_segments, emit_lock=None):
         self.queue = q
         self.return_queue = return_q
-        self.emit_queue = emit_q
         self.loaded_event = loaded_event
+        self.shared_memory = SharedMemoryReader(free_segments)
+        self.messages = WindowQueues()
+        threading.Thread(target=self._read_queue, daemon=True).start()
 
         self.is_alive = True
+        self.debug = False
 
-        self.callback_api = CallbackAPI(emit_q)
+        self.callback_api = CallbackAPI(emit_conn, emit_lock)
         self.windows: typing.List[webview.Window] = []
         self.loop()
 
 
     def create_window(
         self, width, height, x, y, screen=None, on_top=False,
-        maximize=False, title=''
+        maximize=False, title='', hidden=False
     ):
         screen = webview.screens[screen] if screen is not None else None
         if maximize:
@@ -56,25 +166,48 @@ class PyWV:
             y=y,
             screen=screen,
             on_top=on_top,
+            hidden=hidden,
             background_color='#000000')
         )
 
         self.windows[-1].events.loaded += lambda: self.loaded_event.set()
 
+    def configure_window(
+        self, i, width, height, x, y, screen=None, on_top=False,
+        maximize=False, title=''
+    ):
+        window = self.windows[i]
+        screen = webview.screens[screen] if screen is not None else None
+        if maximize:
+            window.maximize()
+        else:
+            window.resize(width, height)
+        if x is not None and y is not None:
+            window.move(x + (screen.x if screen else 0), y + (screen.y if screen else 0))
+        window.on_top = on_top
+        window.set_title(title)
+
+    def _read_queue(self):
+        while True:
+            self.messages.put(self.queue.get())
 
     def loop(self):
         # self.loaded_event.set()
         while self.is_alive:
-            i, arg = self.queue.get()
+            i, arg = self.messages.get()
 
             if i == 'start':
+                self.debug = arg
                 webview.start(debug=arg, func=self.loop)
                 self.is_alive = False
-                self.emit_queue.put('exit')
+                self.callback_api.callback('exit')
                 return
             if i == 'create_window':
                 self.create_window(*arg)
                 continue
+            if i == 'configure_window':
+                self.configure_window(*arg)
+                continue
 
             window = self.windows[i]
             if arg == 'show':
@@ -83,10 +216,14 @@ class PyWV:
                 window.hide()
             else:
                 try:
-                    if '_~_~RETURN~_~_' in arg:
-                        self.return_queue.put(window.evaluate_js(arg[14:]))
+                    if isinstance(arg, tuple):
+                        arg = self.shared_memory.read(arg)
+                    if arg.startswith('_~_~RETURN~_~_'):
+                        request_id, script = arg[14:].split('_~_', 1)
+                        self.return_queue.put((int(request_id), window.evaluate_js(script)))
                     else:
-                        window.evaluate_js(arg)
+                        # the scripts queued behind it are run with it, as each call waits on the GUI thread
+                        self.run_js(window, arg, *self.messages.take_scripts(i, len(arg)))
                 except KeyError as e:
                     return
                 except JavascriptException as e:
@@ -94,55 +231,179 @@ class PyWV:
                     raise JavascriptException(f"\n\nscript -> '{arg}',\nerror -> {msg['name']}[{msg['line']}:{msg['column']}]\n{msg['message']}")
 
 
+    def run_js(self, window: webview.Window, *scripts: str):
+        """
+        Runs scripts in a single call, without waiting for their result to be serialized and sent back.
+        Errors are only raised in debug mode, where each script is evaluated and waited on in turn.
+        """
+        run_js = getattr(window, 'run_js', None)
+        if self.debug or run_js is None:
+            for script in scripts:
+                window.evaluate_js(script)
+        else:
+            # unlike evaluate_js, a script is not wrapped in an eval, so its declarations need a block of their own
+            run_js('\n'.join(f'{{\n{script}\n}}' for script in scripts))
+
+
+class WebviewWorker:
+    """
+    A webview process, hosting some of the windows of a `WebviewHandler`.
+    """
+    def __init__(self, handler: 'WebviewHandler'):
+        self.queue = mp.Queue()
+        self.windows = 0
+        self.process = mp.Process(
+            target=PyWV, args=(
+                self.queue, handler._emit_send, handler.return_queue,
+                handler.loaded_event, handler.free_segment_queue, handler._emit_lock
+            ),
+            daemon=True
+        )
+
+
 class WebviewHandler():
-    def __init__(self) -> None:
+    # scripts of at least this many characters are passed through shared memory rather than pickled
+    shared_memory_threshold = 2 ** 20
+
+    def __init__(self, processes: int = 1) -> None:
+        # windows are shared between up to this many webview processes
+        self.processes = processes
+        self._segments: typing.Dict[str, SharedMemory] = {}
+        self._free_segments: typing.List[str] = []
+        self._segment_lock = threading.Lock()
         self._reset()
         self.debug = False
 
     def _reset(self):
         self.loaded_event = mp.Event()
         self.return_queue = mp.Queue()
-        self.function_call_queue = mp.Queue()
-        self.emit_queue = mp.Queue()
-        self.wv_process = mp.Process(
-            target=PyWV, args=(
-                self.function_call_queue, self.emit_queue,
-                self.return_queue, self.loaded_event
-            ),
-            daemon=True
-        )
-        self.max_window_num = -1
+        self.free_segment_queue = mp.Queue()
+        # callbacks arrive through a pipe, which the event loop can wait on directly
+        self.emit_conn, self._emit_send = mp.Pipe(duplex=False)
+        self._emit_lock = mp.Lock()
+        self.workers: typing.List[WebviewWorker] = []
+        # the worker of each window, and the window's index within it
+        self._windows: typing.List[typing.Tuple[WebviewWorker, int]] = []
+        self._started = False
+        self._running = 0
+        self.spare_windows = deque()
+        self.hidden_windows = set()
+
+    @property
+    def max_window_num(self) -> int:
+        return len(self._windows) - 1
 
     def create_window(
         self, width, height, x, y, screen=None, on_top=False,
         maximize=False, title=''
     ):
-        self.function_call_queue.put((
-            'create_window',
-            (width, height, x, y, screen, on_top, maximize, title)
-        ))
-        self.max_window_num += 1
+        args = (width, height, x, y, screen, on_top, maximize, title)
+        if self.spare_windows:
+            window_num = self.spare_windows.popleft()
+            worker, i = self._windows[window_num]
+            worker.queue.put(('configure_window', (i, *args)))
+            return window_num
+        return self._new_window(args)
+
+    def _new_window(self, args: tuple) -> int:
+        if len(self.workers) < self.processes:
+            self.workers.append(WebviewWorker(self))
+        worker = min(self.workers, key=lambda w: w.windows)
+        worker.queue.put(('create_window', args))
+        self._windows.append((worker, worker.windows))
+        worker.windows += 1
+        if self._started:
+            self._start_workers()
         return self.max_window_num
 
+    def prewarm(self, windows: int = 1):
+        """
+        Starts the webview process in the background, loading hidden windows for the next charts created.
+        """
+        for _ in range(windows - len(self.spare_windows)):
+            window_num = self._new_window((800, 600, None, None, None, False, False, '', True))
+            self.spare_windows.append(window_num)
+            self.hidden_windows.add(window_num)
+        self._start_workers()
+
+    def _start_workers(self):
+        if not self._started:
+            self.loaded_event.clear()
+            self._started = True
+        for worker in self.workers:
+            if worker.process.pid is None:
+                worker.process.start()
+                worker.queue.put(('start', self.debug))
+                self._running += 1
+        if len(self.workers) == self.processes and not self._emit_send.closed:
+            # once every worker has its end, the pipe closes when they have all exited
+            self._emit_send.close()
+
     def start(self):
-        self.loaded_event.clear()
-        self.wv_process.start()
-        self.function_call_queue.put(('start', self.debug))
+        self._start_workers()
         self.loaded_event.wait()
 
+    def worker_exited(self) -> bool:
+        """
+        Counts a worker whose windows have all been closed, returning True once none are left.
+        """
+        self._running -= 1
+        return self._running <= 0
+
     def show(self, window_num):
-        self.function_call_queue.put((window_num, 'show'))
+        self.hidden_windows.discard(window_num)
+        worker, i = self._windows[window_num]
+        worker.queue.put((i, 'show'))
 
     def hide(self, window_num):
-        self.function_call_queue.put((window_num, 'hide'))
+        worker, i = self._windows[window_num]
+        worker.queue.put((i, 'hide'))
 
-    def evaluate_js(self, window_num, script):
-        self.function_call_queue.put((window_num, script))
+    def evaluate_js(self, window_num, script, key=None):
+        if len(script) >= self.shared_memory_threshold:
+            script = self._to_shared_memory(script.encode())
+        worker, i = self._windows[window_num]
+        worker.queue.put((i, script) if key is None else (i, script, key))
+
+    def _to_shared_memory(self, data: bytes) -> tuple:
+        """
+        Writes the data to a segment no longer being read (or a new one), returning its handle.
+        """
+        with self._segment_lock:
+            while True:
+                try:
+                    self._free_segments.append(self.free_segment_queue.get_nowait())
+                except queue.Empty:
+                    break
+            fitting = [name for name in self._free_segments if self._segments[name].size >= len(data)]
+            if fitting:
+                name = min(fitting, key=lambda n: self._segments[n].size)
+                self._free_segments.remove(name)
+            else:
+                size = 1 << max(len(data) - 1, 0).bit_length()
+                segment = SharedMemory(create=True, size=size)
+                name = segment.name
+                self._segments[name] = segment
+            self._segments[name].buf[:len(data)] = data
+        return 'shm', name, len(data)
+
+    def _release_segments(self):
+        with self._segment_lock:
+            for segment in self._segments.values():
+                segment.close()
+                segment.unlink()
+            self._segments.clear()
+            self._free_segments.clear()
 
     def exit(self):
-        if self.wv_process.is_alive():
-            self.wv_process.terminate()
-            self.wv_process.join()
+        for worker in self.workers:
+            if worker.process.is_alive():
+                worker.process.terminate()
+                worker.process.join()
+        self.return_queue.put(None)     # stops the thread resolving responses from this queue
+        self.emit_conn.close()
+        self._emit_send.close()
+        self._release_segments()
         self._reset()
 
 
@@ -173,13 +434,16 @@ class Chart(abstract.AbstractChart):
                 )
 
         window = abstract.Window(
-                    script_func=lambda s: Chart.WV.evaluate_js(self._i, s),
-                    js_api_code='pywebview.api.callback'
+                    script_func=lambda s, key=None: Chart.WV.evaluate_js(self._i, s, key),
+                    js_api_code='pywebview.api.callback',
+                    script_keys=True
                 )
 
         abstract.Window._return_q = Chart.WV.return_queue
 
         self.is_alive = True
+        # wakes the callback loop of `show_async`, while it is waiting on the pipe
+        self._wake_callbacks = None
 
         if Chart._main_window_handlers is None:
             super().__init__(window, inner_width, inner_height, scale_candles_only, toolbox, position=position)
@@ -196,6 +460,8 @@ class Chart(abstract.AbstractChart):
         if not self.win.loaded:
             Chart.WV.start()
             self.win.on_js_load()
+            if self._i in Chart.WV.hidden_windows:
+                Chart.WV.show(self._i)
         else:
             Chart.WV.show(self._i)
         if block:
@@ -206,22 +472,47 @@ class Chart(abstract.AbstractChart):
         try:
             from lightweight_charts import polygon
             [asyncio.create_task(self.polygon.async_set(*args)) for args in polygon._set_on_load]
-            while 1:
-                while Chart.WV.emit_queue.empty() and self.is_alive:
-                    await asyncio.sleep(0.05)
-                if not self.is_alive:
-                    return
-                response = Chart.WV.emit_queue.get()
-                if response == 'exit':
-                    Chart.WV.exit()
-                    self.is_alive = False
-                    return
-                else:
-                    func, args = parse_event_message(self.win, response)
-                    await func(*args) if asyncio.iscoroutinefunction(func) else func(*args)
+            await self._handle_callbacks()
         except KeyboardInterrupt:
             return
 
+    async def _handle_callbacks(self):
+        loop = asyncio.get_running_loop()
+        conn = Chart.WV.emit_conn
+        fd, ready = conn.fileno(), asyncio.Event()
+        try:
+            loop.add_reader(fd, ready.set)
+            self._wake_callbacks = lambda: loop.call_soon_threadsafe(ready.set)
+        except NotImplementedError:
+            # the proactor event loop on Windows cannot wait on pipes
+            ready = None
+        try:
+            while self.is_alive:
+                if ready:
+                    await ready.wait()
+                    ready.clear()
+                    if not self.is_alive:
+                        return
+                else:
+                    await loop.run_in_executor(None, conn.poll, 0.2)
+                while self.is_alive and conn.poll():
+                    try:
+                        response = conn.recv()
+                    except EOFError:
+                        response = None     # every webview process has exited
+                    if response == 'exit' and not Chart.WV.worker_exited():
+                        continue
+                    if response in ('exit', None):
+                        Chart.WV.exit()
+                        self.is_alive = False
+                        return
+                    for func, args in parse_event_messages(self.win, response):
+                        await func(*args) if asyncio.iscoroutinefunction(func) else func(*args)
+        finally:
+            self._wake_callbacks = None
+            if ready:
+                loop.remove_reader(fd)
+
     def hide(self):
         """
         Hides the chart window.\n
@@ -232,5 +523,11 @@ class Chart(abstract.AbstractChart):
         """
         Exits and destroys the chart window.\n
         """
-        Chart.WV.exit()
         self.is_alive = False
+        Chart.WV.exit()
+        if self._wake_callbacks:
+            self._wake_callbacks()
+
+
+if os.environ.get('LWC_PREWARM') and mp.parent_process() is None:
+    Chart.WV.prewarm()
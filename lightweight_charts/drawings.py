@@ -112,7 +112,7 @@ class HorizontalLine(Drawing):
         """
         Moves the horizontal line to the given price.
         """
-        self.run_script(f'{self.id}.updatePoints({{price: {price}}})')
+        self.win.run_command('update_points', self.id, {'price': price}, key=(self.id, 'update'))
         # self.run_script(f'{self.id}.updatePrice({price})')
         self.price = price
 
@@ -0,0 +1,213 @@
+import asyncio
+import hashlib
+import os
+import struct
+import threading
+from base64 import b64encode
+from concurrent.futures import Future
+from typing import Dict, Optional
+
+from lightweight_charts import abstract
+from .util import FLOAT
+from .widgets import emit_callback
+
+_GUID = '258EAFA5-E914-47DA-95CA-C5AB0DC85B11'
+_CONTENT_TYPES = {'.html': 'text/html', '.js': 'application/javascript', '.css': 'text/css'}
+
+# runs each script received, and sends callbacks back through the socket
+_CLIENT = '''
+<script>
+    window.lwcSocket = new WebSocket(`ws://${location.host}/ws`)
+    lwcSocket.binaryType = 'arraybuffer'
+    const lwcDecoder = new TextDecoder()
+    lwcSocket.onmessage = (event) => (0, eval)(lwcDecoder.decode(event.data))
+    window.lwcSend = (message) => lwcSocket.send(message)
+</script>
+'''
+
+
+class ServerWindow(abstract.Window):
+    _return_q = None
+
+    def _request(self, script: str) -> Future:
+        raise NotImplementedError(
+            'Scripts cannot return values to a ServerChart, which may have any number of clients (or none).')
+
+
+class ServerChart(abstract.AbstractChart):
+    """
+    Serves the chart to any number of browsers, from an HTTP and WebSocket server on `host:port`.
+    Scripts are sent to every client as binary frames, and replayed to clients connecting later.
+    """
+    def __init__(self, host: str = '127.0.0.1', port: int = 8765, inner_width: float = 1.0,
+                 inner_height: float = 1.0, scale_candles_only: bool = False, toolbox: bool = False,
+                 position: FLOAT = 'left'):
+        self.host, self.port = host, port
+        self.is_alive = False
+        # each client, with the number of scripts sent when it joined (which it has been sent as the snapshot)
+        self._clients: Dict[asyncio.StreamWriter, int] = {}
+        # every script sent, without those superseded by a later script (see `abstract.superseded_keys`)
+        self._snapshot: Dict[object, str] = {}
+        self._script_count = 0
+        self._lock = threading.Lock()
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._server: Optional[asyncio.AbstractServer] = None
+        self._started = threading.Event()
+
+        window = ServerWindow(script_func=self._broadcast, js_api_code='window.lwcSend', script_keys=True)
+        super().__init__(window, inner_width, inner_height, scale_candles_only, toolbox, position=position)
+        self.win.on_js_load()
+
+    def show(self, block: bool = False):
+        """
+        Starts serving the chart, returning once the server is listening.\n
+        :param block: blocks execution until the server is stopped.
+        """
+        if block:
+            asyncio.run(self.show_async())
+            return
+        threading.Thread(target=asyncio.run, args=(self.show_async(),), daemon=True).start()
+        self._started.wait()
+
+    async def show_async(self):
+        self._loop = asyncio.get_running_loop()
+        self._server = await asyncio.start_server(self._handle_connection, self.host, self.port)
+        self.port = self._server.sockets[0].getsockname()[1]
+        self.is_alive = True
+        self._started.set()
+        try:
+            await self._server.serve_forever()
+        except asyncio.CancelledError:
+            pass
+        finally:
+            for writer in list(self._clients):
+                writer.close()
+            self.is_alive = False
+
+    def exit(self):
+        """
+        Stops the server, disconnecting every client.
+        """
+        if self._server is not None:
+            self._loop.call_soon_threadsafe(self._server.close)
+        self._started.clear()
+
+    def screenshot(self) -> bytes:
+        raise NotImplementedError('ServerChart cannot take screenshots, as it has no window of its own.')
+
+    def _broadcast(self, script: str, key: Optional[tuple] = None):
+        with self._lock:
+            self._script_count += 1
+            count = self._script_count
+            if key is None:
+                key = count
+            else:
+                for superseded in abstract.superseded_keys(self._snapshot, key):
+                    del self._snapshot[superseded]
+            self._snapshot[key] = script
+        if not self.is_alive:
+            return
+        frame = _frame(script.encode())
+        try:
+            running = asyncio.get_running_loop()
+        except RuntimeError:
+            running = None
+        if running is self._loop:
+            self._send_all(frame, count)
+        else:
+            self._loop.call_soon_threadsafe(self._send_all, frame, count)
+
+    def _send_all(self, frame: bytes, count: int):
+        for writer, joined in self._clients.items():
+            if count > joined:
+                writer.write(frame)
+
+    async def _handle_connection(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        try:
+            request = await reader.readuntil(b'\r\n\r\n')
+        except (asyncio.IncompleteReadError, asyncio.LimitOverrunError):
+            writer.close()
+            return
+        lines = request.decode('latin-1').split('\r\n')
+        path = lines[0].split(' ')[1] if len(lines[0].split(' ')) > 1 else '/'
+        headers = {k.strip().lower(): v.strip() for k, _, v in (line.partition(':') for line in lines[1:] if line)}
+
+        if headers.get('upgrade', '').lower() == 'websocket':
+            await self._handle_socket(reader, writer, headers)
+            return
+        self._serve_file(writer, path)
+        await writer.drain()
+        writer.close()
+
+    @staticmethod
+    def _serve_file(writer: asyncio.StreamWriter, path: str):
+        name = os.path.basename(path.split('?')[0]) or 'index.html'
+        file = os.path.join(os.path.dirname(abstract.INDEX), name)
+        if not os.path.isfile(file):
+            writer.write(b'HTTP/1.1 404 Not Found\r\nContent-Length: 0\r\nConnection: close\r\n\r\n')
+            return
+        with open(file, 'rb') as f:
+            body = f.read()
+        if name == 'index.html':
+            body = body.replace(b'</body>', _CLIENT.encode() + b'</body>')
+        content_type = _CONTENT_TYPES.get(os.path.splitext(name)[1], 'application/octet-stream')
+        writer.write(
+            f'HTTP/1.1 200 OK\r\nContent-Type: {content_type}; charset=utf-8\r\n'
+            f'Content-Length: {len(body)}\r\nConnection: close\r\n\r\n'.encode() + body)
+
+    async def _handle_socket(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter, headers: dict):
+        accept = b64encode(hashlib.sha1((headers['sec-websocket-key'] + _GUID).encode()).digest()).decode()
+        writer.write(
+            'HTTP/1.1 101 Switching Protocols\r\nUpgrade: websocket\r\nConnection: Upgrade\r\n'
+            f'Sec-WebSocket-Accept: {accept}\r\n\r\n'.encode())
+        with self._lock:
+            for script in self._snapshot.values():
+                writer.write(_frame(script.encode()))
+            self._clients[writer] = self._script_count
+        try:
+            await writer.drain()
+            message = b''
+            while True:
+                final, opcode, payload = await _read_frame(reader)
+                if opcode == 0x8:
+                    writer.write(_frame(payload[:2], 0x8))
+                    break
+                if opcode == 0x9:
+                    writer.write(_frame(payload, 0xA))
+                    continue
+                if opcode in (0x0, 0x1, 0x2):
+                    message += payload
+                    if final:
+                        emit_callback(self.win, message.decode())
+                        message = b''
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            self._clients.pop(writer, None)
+            writer.close()
+
+
+def _frame(payload: bytes, opcode: int = 0x2) -> bytes:
+    length = len(payload)
+    if length < 126:
+        header = struct.pack('!BB', 0x80 | opcode, length)
+    elif length < 2 ** 16:
+        header = struct.pack('!BBH', 0x80 | opcode, 126, length)
+    else:
+        header = struct.pack('!BBQ', 0x80 | opcode, 127, length)
+    return header + payload
+
+
+async def _read_frame(reader: asyncio.StreamReader):
+    first, second = await reader.readexactly(2)
+    length = second & 0x7F
+    if length == 126:
+        length, = struct.unpack('!H', await reader.readexactly(2))
+    elif length == 127:
+        length, = struct.unpack('!Q', await reader.readexactly(8))
+    mask = await reader.readexactly(4) if second & 0x80 else None
+    payload = await reader.readexactly(length)
+    if mask:
+        payload = (int.from_bytes(payload, 'big') ^ int.from_bytes((mask * (length // 4 + 1))[:length], 'big')
+                   ).to_bytes(length, 'big')
+    return bool(first & 0x80), first & 0x0F, payload
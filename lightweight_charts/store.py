@@ -0,0 +1,307 @@
+from typing import Dict, List, Mapping, Optional
+
+import numpy as np
+import pandas as pd
+
+
+class BarStore:
+    """
+    Columnar store of bars, backed by preallocated arrays which grow geometrically.
+    Appending a bar and overwriting the last bar are amortized O(1).
+    """
+    def __init__(self, capacity: int = 64):
+        self._columns: Dict[str, np.ndarray] = {}
+        self._length = 0
+        self._capacity = capacity
+        self._frame: Optional[pd.DataFrame] = None
+        self._shared = False
+
+    @classmethod
+    def from_frame(cls, df: pd.DataFrame, copy: bool = True) -> 'BarStore':
+        """
+        :param copy: If False, the columns of `df` are held as they are, and only copied on the first write.
+        """
+        if not copy:
+            store = cls(len(df))
+            store._length = len(df)
+            store._columns = {key: df[key].to_numpy() for key in df.columns}
+            store._shared = True
+            return store
+        store = cls(len(df) + max(64, len(df) // 8))
+        store._length = len(df)
+        for key in df.columns:
+            values = df[key].to_numpy()
+            column = np.empty(store._capacity, dtype=values.dtype)
+            column[:store._length] = values
+            store._columns[key] = column
+        return store
+
+    def __len__(self):
+        return self._length
+
+    def __contains__(self, key):
+        return key in self._columns
+
+    def columns(self):
+        return list(self._columns)
+
+    @property
+    def nbytes(self) -> int:
+        return sum(column.nbytes for column in self._columns.values())
+
+    def frame(self) -> pd.DataFrame:
+        """
+        Returns a read-only DataFrame view of the stored bars, which is cached until the store changes.
+        The view is live, so its last row changes if the last bar is overwritten; copy it to keep it.
+        """
+        if self._frame is None:
+            views = {}
+            for key, column in self._columns.items():
+                view = views[key] = column[:self._length]
+                view.flags.writeable = False
+            self._frame = pd.DataFrame(views, copy=False)
+        return self._frame
+
+    def last(self) -> Optional[dict]:
+        if not self._length:
+            return None
+        return {key: column[self._length - 1] for key, column in self._columns.items()}
+
+    def decimate(self, column: str, start: int, end: int, points: int) -> np.ndarray:
+        """
+        Min/max decimation of the rows [start, end), keeping the lowest and highest value of each of
+        `points // 2` equally sized buckets.
+        :return: The sorted indices of the kept rows.
+        """
+        if end - start <= points:
+            return np.arange(start, end)
+        values = self._columns[column][start:end].astype(float)
+        edges = np.unique(np.linspace(0, end - start, max(points // 2, 1) + 1).astype(int)[:-1])
+        counts = np.diff(np.r_[edges, end - start])
+        bucket = np.repeat(np.arange(len(edges)), counts)
+        kept = []
+        for reduce in (np.fmin, np.fmax):
+            extremes = np.repeat(reduce.reduceat(values, edges), counts)
+            matches = np.flatnonzero(values == extremes)
+            kept.append(matches[np.unique(bucket[matches], return_index=True)[1]])
+        # buckets with only missing values keep their first row
+        kept.append(edges[~np.isin(np.arange(len(edges)), bucket[kept[0]])])
+        return start + np.unique(np.concatenate(kept))
+
+    def update(self, bar: Mapping) -> bool:
+        """
+        Overwrites the last bar if `bar` has the same time, otherwise appends it.
+        :return: True if a new bar was appended.
+        """
+        if self._length and bar['time'] == self._columns['time'][self._length - 1]:
+            self._unshare()
+            self._write(self._length - 1, bar)
+            return False
+        self.append(bar)
+        return True
+
+    def update_many(self, df: pd.DataFrame) -> int:
+        """
+        Applies `update` to each row of a frame sorted by unique times, appending in bulk.
+        :return: The number of new bars appended.
+        """
+        start = 0
+        if self._length and len(df) and df['time'].iloc[0] == self._columns['time'][self._length - 1]:
+            self._unshare()
+            self._write(self._length - 1, df.iloc[0])
+            start = 1
+        self.extend(df.iloc[start:])
+        return len(df) - start
+
+    def append(self, bar: Mapping):
+        if self._length == self._capacity:
+            self._grow(self._capacity * 2)
+        self._length += 1
+        self._write(self._length - 1, bar)
+        self._fill_missing(self._length - 1, self._length, bar.keys())
+
+    def extend(self, df: pd.DataFrame):
+        if df.empty:
+            return
+        self._frame = None
+        start, end = self._length, self._length + len(df)
+        if end > self._capacity:
+            self._grow(max(self._capacity * 2, end))
+        for key in df.columns:
+            values = df[key].to_numpy()
+            column = self._columns.get(key)
+            if column is None:
+                column = self._add_column(key, values[0])
+            elif column.dtype.kind != 'O' and column.dtype != values.dtype:
+                numeric = column.dtype.kind in 'iuf' and values.dtype.kind in 'iuf'
+                column = self._columns[key] = column.astype(np.result_type(column, values) if numeric else object)
+            column[start:end] = values
+        self._length = end
+        self._fill_missing(start, end, df.columns)
+
+    def _grow(self, capacity: int):
+        for key, column in self._columns.items():
+            grown = np.empty(capacity, dtype=column.dtype)
+            grown[:self._length] = column[:self._length]
+            self._columns[key] = grown
+        self._capacity = capacity
+        self._shared = False
+
+    def _unshare(self):
+        if self._shared:
+            self._grow(self._capacity + max(64, self._capacity // 8))
+
+    def _write(self, index: int, bar: Mapping):
+        self._frame = None
+        for key, value in bar.items():
+            if value is None:
+                value = np.nan
+            column = self._columns.get(key)
+            if column is None:
+                column = self._add_column(key, value)
+            elif not self._fits(column, value):
+                column = self._columns[key] = column.astype(float if self._is_number(value) else object)
+            column[index] = value
+
+    def _fill_missing(self, start: int, end: int, keys):
+        for key, column in self._columns.items():
+            if key in keys:
+                continue
+            if column.dtype.kind in 'iub':
+                column = self._columns[key] = column.astype(float if column.dtype.kind != 'b' else object)
+            column[start:end] = np.nan if column.dtype.kind == 'f' else None
+
+    def _add_column(self, key, value) -> np.ndarray:
+        if self._is_number(value):
+            column = np.full(self._capacity, np.nan)
+        else:
+            column = np.full(self._capacity, None, dtype=object)
+        self._columns[key] = column
+        return column
+
+    @staticmethod
+    def _is_number(value) -> bool:
+        return isinstance(value, (int, float, np.number)) and not isinstance(value, bool)
+
+    @classmethod
+    def _fits(cls, column: np.ndarray, value) -> bool:
+        kind = column.dtype.kind
+        if kind == 'O':
+            return True
+        if kind == 'f':
+            return cls._is_number(value)
+        if kind in 'iu':
+            return cls._is_number(value) and float(value).is_integer()
+        return isinstance(value, (bool, np.bool_))
+
+
+class TickAggregator:
+    """
+    Aggregates ticks into OHLCV bars, holding the current bar in a float64 array.
+    Ticks are bucketed by integer arithmetic on epoch nanoseconds.
+    """
+    def __init__(self):
+        self.time: Optional[int] = None
+        self._bar = np.full(5, np.nan)
+
+    def reset(self, bar: Optional[Mapping] = None):
+        """
+        Discards the current bar, or replaces it with the given bar (with its time in epoch seconds).
+        """
+        if bar is None:
+            self.time = None
+            self._bar[:] = np.nan
+            return
+        self.time = round(bar['time'] * 10 ** 9)
+        self._bar[:4] = [bar['open'], bar['high'], bar['low'], bar['close']]
+        self._bar[4] = bar['volume'] if 'volume' in bar else np.nan
+
+    @staticmethod
+    def bucket(nanoseconds, interval: float, offset: float):
+        interval, offset = round(interval * 10 ** 9), round(offset * 10 ** 9)
+        return nanoseconds // interval * interval + offset
+
+    def add_tick(self, nanoseconds: int, price: float, volume: float = np.nan,
+                 interval: float = 1, offset: float = 0, cumulative_volume: bool = False) -> List[tuple]:
+        """
+        Adds a single tick.
+        :return: The bars changed by the tick, as (time, open, high, low, close, volume) tuples.
+        """
+        time = self.bucket(nanoseconds, interval, offset)
+        bar = self._bar
+        if time == self.time:
+            previous = bar.copy()
+            bar[1] = max(bar[1], price)
+            bar[2] = min(bar[2], price)
+            bar[3] = price
+            if volume == volume:
+                bar[4] = bar[4] + volume if cumulative_volume and bar[4] == bar[4] else volume
+            if np.array_equal(bar, previous, equal_nan=True):
+                return []
+        else:
+            self._check_order(time)
+            self.time = time
+            bar[:4] = price
+            bar[4] = volume
+        return [self._current()]
+
+    def add_ticks(self, nanoseconds: np.ndarray, prices: np.ndarray, volumes: Optional[np.ndarray] = None,
+                  interval: float = 1, offset: float = 0, cumulative_volume: bool = False) -> List[tuple]:
+        """
+        Adds a chronological batch of ticks.
+        :return: The bars changed by the ticks, as (time, open, high, low, close, volume) tuples.
+        """
+        if not len(nanoseconds):
+            return []
+        times = self.bucket(np.asarray(nanoseconds, dtype='int64'), interval, offset)
+        prices = np.asarray(prices, dtype=float)
+        volumes = np.full(len(prices), np.nan) if volumes is None else np.asarray(volumes, dtype=float)
+        self._check_order(times[0])
+        unsorted = np.flatnonzero(np.diff(times) < 0)
+        if len(unsorted):
+            raise ValueError(
+                f'Trying to update tick of time "{pd.to_datetime(times[unsorted[0] + 1])}", '
+                f'which occurs before the tick time of "{pd.to_datetime(times[unsorted[0]])}" within the batch.')
+
+        starts = np.flatnonzero(np.r_[True, times[1:] != times[:-1]])
+        ends = np.r_[starts[1:], len(times)] - 1
+        bars = np.empty((len(starts), 5))
+        bars[:, 0] = prices[starts]
+        bars[:, 1] = np.maximum.reduceat(prices, starts)
+        bars[:, 2] = np.minimum.reduceat(prices, starts)
+        bars[:, 3] = prices[ends]
+        if cumulative_volume:
+            bars[:, 4] = np.add.reduceat(np.nan_to_num(volumes), starts)
+            bars[np.isnan(np.fmax.reduceat(volumes, starts)), 4] = np.nan
+        else:
+            bars[:, 4] = volumes[ends]
+        bar_times = times[starts]
+
+        if bar_times[0] == self.time:
+            first, bar = bars[0], self._bar
+            first[0] = bar[0]
+            first[1] = max(bar[1], first[1])
+            first[2] = min(bar[2], first[2])
+            if first[4] != first[4]:
+                first[4] = bar[4]
+            elif cumulative_volume and bar[4] == bar[4]:
+                first[4] += bar[4]
+            if len(bars) == 1 and np.array_equal(first, bar, equal_nan=True):
+                return []
+        self.time = int(bar_times[-1])
+        self._bar[:] = bars[-1]
+        return [(self._seconds(time), *bar) for time, bar in zip(bar_times.tolist(), bars.tolist())]
+
+    def _current(self) -> tuple:
+        return (self._seconds(self.time), *self._bar.tolist())
+
+    @staticmethod
+    def _seconds(nanoseconds: int):
+        # whole seconds stay integers, keeping the int64 time column of the store
+        return nanoseconds // 10 ** 9 if nanoseconds % 10 ** 9 == 0 else nanoseconds / 10 ** 9
+
+    def _check_order(self, time):
+        if self.time is not None and time < self.time:
+            raise ValueError(
+                f'Trying to update tick of time "{pd.to_datetime(time)}", '
+                f'which occurs before the last bar time of "{pd.to_datetime(self.time)}".')
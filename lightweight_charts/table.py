@@ -19,7 +19,7 @@ class Section(Pane):
         ''')
 
     def __setitem__(self, key, value):
-        self.run_script(f'{self._table.id}.{self.type}[{key}].innerText = "{value}"')
+        self.win.run_command('set_section_text', self._table.id, self.type, key, str(value))
 
 
 class Row(dict):
@@ -40,7 +40,7 @@ class Row(dict):
         original_value = value
         if column in self._table._formatters:
             value = self._table._formatters[column].replace(self._table.VALUE, str(value))
-        self.run_script(f'{self._table.id}.updateCell("{self.id}", "{column}", "{value}")')
+        self._table.win.run_command('update_cell', self._table.id, str(self.id), str(column), str(value))
         return super().__setitem__(column, original_value)
 
     def background_color(self, column, color): self._style('backgroundColor', column, color)
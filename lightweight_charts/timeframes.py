@@ -0,0 +1,141 @@
+from collections import OrderedDict
+from typing import Union
+
+import numpy as np
+import pandas as pd
+
+from .store import BarStore, TickAggregator
+
+TIMEFRAME = Union[str, float, pd.Timedelta, None]
+
+
+class Timeframes:
+    """
+    Keeps the bars of a chart at a base resolution, deriving higher timeframes from them.
+    Derived bars are cached (least recently used first out, within `max_bytes`) and kept up to date
+    with each new base bar, so switching timeframes needs no refetching.
+    """
+    def __init__(self, chart, max_bytes: int = 256 * 2 ** 20):
+        self._chart = chart
+        self.max_bytes = max_bytes
+        self._base = BarStore()
+        self._interval = 1
+        self._offset = 0
+        self._cache: 'OrderedDict[float, BarStore]' = OrderedDict()
+        self._ticks = TickAggregator()
+        self.current: TIMEFRAME = None
+
+    def set(self, df: pd.DataFrame, timeframe: TIMEFRAME = None, interval=None, offset=None):
+        """
+        Sets the base resolution bars, and shows the given timeframe of them.
+        """
+        df = self._chart._df_datetime_format(df, interval=interval, offset=offset)
+        self._interval, self._offset = self._chart._interval, self._chart.offset
+        self._base = BarStore.from_frame(df[[key for key in df.columns if key in _AGGREGATES]])
+        self._cache.clear()
+        self._ticks.reset()
+        self.show(timeframe)
+
+    def show(self, timeframe: TIMEFRAME = None, keep_drawings: bool = False):
+        """
+        Shows the bars of `timeframe` (in seconds, or a timedelta string such as '5min'), or the base bars if None.
+        """
+        self.current = timeframe
+        if timeframe is None:
+            self._chart.set(self._base.frame(), keep_drawings, interval=self._interval, offset=self._offset)
+            return
+        seconds = self._seconds(timeframe)
+        self._chart.set(self._get(seconds).frame(), keep_drawings, interval=seconds)
+
+    def update(self, series: pd.Series):
+        """
+        Updates the base bars (as with `update`), along with every cached timeframe.
+        """
+        series = series.rename(str.lower)
+        series = series.rename({'date': 'time'}) if 'date' in series.index else series
+        nanoseconds = self._chart._single_nanoseconds(series['time'])
+        time = int(TickAggregator.bucket(nanoseconds, self._interval, self._offset) // 10 ** 9)
+        self._update_bar({'time': time, **{key: series[key] for key in series.index if key in _PRICES}})
+
+    def update_from_tick(self, series: pd.Series, cumulative_volume: bool = False):
+        """
+        Updates the base bars from a tick (as with `update_from_tick`), along with every cached timeframe.
+        """
+        series = series.rename(str.lower)
+        series = series.rename({'date': 'time'}) if 'date' in series.index else series
+        if self._ticks.time is None and len(self._base):
+            self._ticks.reset(self._base.last())
+        bars = self._ticks.add_tick(
+            self._chart._single_nanoseconds(series['time']), series['price'],
+            series['volume'] if 'volume' in series.index else np.nan,
+            self._interval, self._offset, cumulative_volume
+        )
+        for time, *values in bars:
+            bar = dict(zip(('open', 'high', 'low', 'close', 'volume'), values))
+            if 'volume' not in self._base:
+                del bar['volume']
+            self._update_bar({'time': int(time), **bar})
+
+    def _update_bar(self, bar: dict):
+        last = self._base.last()
+        if last is not None and bar['time'] < last['time']:
+            raise ValueError(
+                f'Trying to update bar of time "{pd.to_datetime(bar["time"], unit="s")}", '
+                f'which occurs before the last bar time of "{pd.to_datetime(last["time"], unit="s")}".')
+        self._base.update(bar)
+        if self.current is None:
+            self._chart.update(pd.Series({**bar, 'time': pd.Timestamp(bar['time'], unit='s')}))
+        current = None if self.current is None else self._seconds(self.current)
+        base = self._base.frame()
+        for seconds, store in self._cache.items():
+            start = bar['time'] // seconds * seconds
+            rows = base.iloc[np.searchsorted(base['time'].to_numpy(), start):]
+            derived = {key: values[0] for key, values in self._resample(rows, seconds).items()}
+            store.update(derived)
+            if seconds == current:
+                self._chart.update(pd.Series({**derived, 'time': pd.Timestamp(start, unit='s')}))
+
+    def _get(self, seconds: float) -> BarStore:
+        if seconds in self._cache:
+            self._cache.move_to_end(seconds)
+            return self._cache[seconds]
+        store = self._cache[seconds] = BarStore.from_frame(pd.DataFrame(self._resample(self._base.frame(), seconds)))
+        while len(self._cache) > 1 and sum(cached.nbytes for cached in self._cache.values()) > self.max_bytes:
+            self._cache.popitem(last=False)
+        return store
+
+    @staticmethod
+    def _resample(df: pd.DataFrame, seconds: float) -> dict:
+        times = df['time'].to_numpy()
+        buckets = (times // seconds * seconds).astype('int64')
+        starts = np.flatnonzero(np.r_[True, buckets[1:] != buckets[:-1]])
+        ends = np.r_[starts[1:], len(buckets)] - 1
+        columns = {'time': buckets[starts]}
+        for key, aggregate in _AGGREGATES.items():
+            if key == 'time' or key not in df:
+                continue
+            values = df[key].to_numpy(dtype=float)
+            if aggregate == 'first':
+                columns[key] = values[starts]
+            elif aggregate == 'last':
+                columns[key] = values[ends]
+            else:
+                columns[key] = aggregate.reduceat(values, starts)
+        return columns
+
+    @staticmethod
+    def _seconds(timeframe) -> float:
+        if pd.api.types.is_number(timeframe):
+            return float(timeframe)
+        return pd.Timedelta(timeframe).total_seconds()
+
+
+_AGGREGATES = {
+    'time': None,
+    'open': 'first',
+    'high': np.fmax,
+    'low': np.fmin,
+    'close': 'last',
+    'volume': np.add,
+}
+_PRICES = ('open', 'high', 'low', 'close', 'volume')
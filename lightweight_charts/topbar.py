@@ -36,7 +36,7 @@ class TextWidget(Widget):
 
     def set(self, string):
         self.value = string
-        self.run_script(f'{self.id}.innerText = "{string}"')
+        self.win.run_command('set_text', self.id, str(string), key=(self.id, 'update'))
 
 
 class SwitcherWidget(Widget):
@@ -1,9 +1,11 @@
 import asyncio
 import json
+import sys
+from base64 import b64encode
 from datetime import datetime
 from random import choices
-from typing import Literal, Union
-from numpy import isin
+from typing import Callable, List, Literal, Mapping, Optional, Tuple, Union
+import numpy as np
 import pandas as pd
 
 
@@ -36,14 +38,89 @@ def parse_event_message(window, string):
     return func, args
 
 
-def js_data(data: Union[pd.DataFrame, pd.Series]):
-    if isinstance(data, pd.DataFrame):
-        d = data.to_dict(orient='records')
-        filtered_records = [{k: v for k, v in record.items() if v is not None and not pd.isna(v)} for record in d]
+def parse_event_messages(window, string) -> List[Tuple[Callable, list]]:
+    """
+    Parses a JSON batch of `[name, args]` events, or a single event in the `name_~_arg1;;;arg2` format.
+    """
+    if not string.startswith('['):
+        return [parse_event_message(window, string)]
+    return [(window.handlers[name], args) for name, args in json.loads(string)]
+
+
+def as_frame(data):
+    """
+    Wraps a NumPy structured array, pyarrow Table/RecordBatch or Polars DataFrame in a DataFrame,
+    without copying any columns which can be viewed as NumPy arrays. Anything else is returned as given.
+    """
+    if isinstance(data, np.ndarray) and data.dtype.names:
+        columns = {name: data[name] for name in data.dtype.names}
+    elif (pa := sys.modules.get('pyarrow')) and isinstance(data, (pa.Table, pa.RecordBatch)):
+        columns = {name: data.column(name).to_numpy(zero_copy_only=False) for name in data.column_names}
+    elif (pl := sys.modules.get('polars')) and isinstance(data, pl.DataFrame):
+        columns = {name: data[name].to_numpy() for name in data.columns}
     else:
-        d = data.to_dict()
-        filtered_records = {k: v for k, v in d.items()}
-    return json.dumps(filtered_records, indent=2)
+        return data
+    return pd.DataFrame(columns, copy=False)
+
+
+def js_column(values) -> list:
+    """
+    Converts a column to a JSON-ready list, replacing any missing values with None.
+    """
+    values = values.to_numpy() if isinstance(values, pd.Series) else np.asarray(values)
+    if values.dtype.kind in 'iub':
+        return values.tolist()
+    mask = pd.isna(values)
+    if not mask.any():
+        return values.tolist()
+    values = values.astype(object)
+    values[mask] = None
+    return values.tolist()
+
+
+def js_columns(data: Union[pd.DataFrame, Mapping]) -> str:
+    """
+    Serializes the data column by column; rows are rebuilt by `Lib.Handler.fromColumns`.
+    """
+    columns = {str(key): js_column(data[key]) for key in data.keys()}
+    return json.dumps(columns, separators=(',', ':'))
+
+
+def binary_columns(data: Union[pd.DataFrame, Mapping]) -> Tuple[dict, dict]:
+    """
+    Splits the data into base64 float64 buffers of the numeric columns (NaN marking missing values),
+    and JSON-ready lists of the other columns.
+    """
+    buffers, columns = {}, {}
+    for key in data.keys():
+        values = data[key]
+        values = values.to_numpy() if isinstance(values, pd.Series) else np.asarray(values)
+        if values.dtype.kind in 'iufb':
+            buffers[str(key)] = b64encode(values.astype('<f8').tobytes()).decode()
+        else:
+            columns[str(key)] = js_column(values)
+    return buffers, columns
+
+
+def js_binary(data: Union[pd.DataFrame, Mapping]) -> str:
+    """
+    Packs the data with `binary_columns`; the buffers are wrapped in a `Float64Array`
+    by `Lib.Handler.fromBinary` rather than parsed.
+    """
+    buffers, columns = binary_columns(data)
+    separators = (',', ':')
+    return f'Lib.Handler.fromBinary({json.dumps(buffers, separators=separators)}, {json.dumps(columns, separators=separators)})'
+
+
+def js_data(data: Union[pd.DataFrame, pd.Series, Mapping], binary: bool = False):
+    """
+    Serializes a frame (or a mapping of array columns) as rows, or a single row as an object.
+    """
+    if isinstance(data, pd.DataFrame) or (
+            isinstance(data, Mapping) and isinstance(next(iter(data.values()), None), np.ndarray)):
+        return js_binary(data) if binary else f'Lib.Handler.fromColumns({js_columns(data)})'
+    data = data if isinstance(data, Mapping) else data.to_dict()
+    return json.dumps(data, separators=(',', ':'), default=lambda o: o.item())
 
 
 def snake_to_camel(s: str):
@@ -134,6 +211,21 @@ class JSEmitter:
         self._on_iadd(other)
         return self
 
+    def rate_limit(self, throttle: Optional[float] = None, debounce: Optional[float] = None):
+        """
+        Sends the event at most once every `throttle` seconds (with its latest arguments),
+        or only once it has stopped firing for `debounce` seconds. Neither sends every event.
+        """
+        if not throttle and not debounce:
+            self._chart.run_script(f'delete lwcEvents.rates["{self._name}"]')
+            return
+        rate = {'throttle': throttle and throttle * 1000, 'debounce': debounce and debounce * 1000}
+        self._chart.run_script(f'lwcEvents.rates["{self._name}"] = {json.dumps(rate)}')
+
+
+def _float_or_none(value):
+    return None if value in (None, 'null', 'undefined') else float(value)
+
 
 class Events:
     def __init__(self, chart):
@@ -148,12 +240,8 @@ class Events:
         self.range_change = JSEmitter(chart, f'range_change{salt}',
             lambda o: chart.run_script(f'''
             let checkLogicalRange{salt} = (logical) => {{
-                {chart.id}.chart.timeScale().unsubscribeVisibleLogicalRangeChange(checkLogicalRange{salt})
-                
                 let barsInfo = {chart.id}.series.barsInLogicalRange(logical)
-                if (barsInfo) window.callbackFunction(`range_change{salt}_~_${{barsInfo.barsBefore}};;;${{barsInfo.barsAfter}}`)
-                    
-                setTimeout(() => {chart.id}.chart.timeScale().subscribeVisibleLogicalRangeChange(checkLogicalRange{salt}), 50)
+                if (barsInfo) lwcEmit("range_change{salt}", [barsInfo.barsBefore, barsInfo.barsAfter], true)
             }}
             {chart.id}.chart.timeScale().subscribeVisibleLogicalRangeChange(checkLogicalRange{salt})
             '''),
@@ -166,11 +254,23 @@ class Events:
                 if (!param.point) return;
                 const time = {chart.id}.chart.timeScale().coordinateToTime(param.point.x)
                 const price = {chart.id}.series.coordinateToPrice(param.point.y);
-                window.callbackFunction(`subscribe_click{salt}_~_${{time}};;;${{price}}`)
+                lwcEmit("subscribe_click{salt}", [time, price])
             }}
             {chart.id}.chart.subscribeClick(clickHandler{salt})
             '''),
-            wrapper=lambda func, c, *args: func(c, *[float(a) if a != 'null' else None for a in args])
+            wrapper=lambda func, c, *args: func(c, *[_float_or_none(a) for a in args])
+        )
+
+        self.crosshair_move = JSEmitter(chart, f'crosshair_move{salt}',
+            lambda o: chart.run_script(f'''
+            let crosshairHandler{salt} = (param) => {{
+                const time = param.point ? {chart.id}.chart.timeScale().coordinateToTime(param.point.x) : null
+                const price = param.point ? {chart.id}.series.coordinateToPrice(param.point.y) : null
+                lwcEmit("crosshair_move{salt}", [time, price], true)
+            }}
+            {chart.id}.chart.subscribeCrosshairMove(crosshairHandler{salt})
+            '''),
+            wrapper=lambda func, c, *args: func(c, *[_float_or_none(a) for a in args])
         )
 
 class BulkRunScript:
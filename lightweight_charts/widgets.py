@@ -1,7 +1,12 @@
 import asyncio
 import html
+import json
+import shutil
+import subprocess
+from concurrent.futures import Future
+from typing import List
 
-from .util import parse_event_message
+from .util import parse_event_messages
 from lightweight_charts import abstract
 
 try:
@@ -54,8 +59,8 @@ except ImportError:
 
 
 def emit_callback(window, string):
-    func, args = parse_event_message(window, string)
-    asyncio.create_task(func(*args)) if asyncio.iscoroutinefunction(func) else func(*args)
+    for func, args in parse_event_messages(window, string):
+        asyncio.create_task(func(*args)) if asyncio.iscoroutinefunction(func) else func(*args)
 
 
 class WxChart(abstract.AbstractChart):
@@ -64,7 +69,8 @@ class WxChart(abstract.AbstractChart):
         if wx is None:
             raise ModuleNotFoundError('wx.html2 was not found, and must be installed to use WxChart.')
         self.webview: wx.html2.WebView = wx.html2.WebView.New(parent)
-        super().__init__(abstract.Window(self.webview.RunScript, 'window.wx_msg.postMessage.bind(window.wx_msg)'),
+        super().__init__(abstract.Window(self.webview.RunScript, 'window.wx_msg.postMessage.bind(window.wx_msg)',
+                                         schedule_func=lambda delay, func: wx.CallLater(round(delay * 1000), func)),
                          inner_width, inner_height, scale_candles_only, toolbox)
 
         self.webview.Bind(wx.html2.EVT_WEBVIEW_LOADED, lambda e: wx.CallLater(500, self.win.on_js_load))
@@ -83,7 +89,8 @@ class QtChart(abstract.AbstractChart):
         if QWebEngineView is None:
             raise ModuleNotFoundError('QWebEngineView was not found, and must be installed to use QtChart.')
         self.webview = QWebEngineView(widget)
-        super().__init__(abstract.Window(self.webview.page().runJavaScript, 'window.pythonObject.callback'),
+        super().__init__(abstract.Window(self.webview.page().runJavaScript, 'window.pythonObject.callback',
+                                         schedule_func=lambda delay, func: QTimer.singleShot(round(delay * 1000), func)),
                          inner_width, inner_height, scale_candles_only, toolbox)
 
         self.web_channel = QWebChannel()
@@ -113,6 +120,87 @@ class QtChart(abstract.AbstractChart):
     def get_webview(self): return self.webview
 
 
+class NullWindow(abstract.Window):
+    """
+    A window which records the scripts sent to it rather than running them, counting the calls and bytes sent.
+    Scripts can be checked to be valid JavaScript (using Node.js), though they are never run.
+    """
+    _return_q = None
+
+    def __init__(self, check_syntax: bool = False, keep: bool = True):
+        super().__init__(script_func=self._record)
+        self.keep = keep
+        self.recorded: List[str] = []
+        self.calls = 0
+        self.bytes = 0
+        self._checker = _SyntaxChecker() if check_syntax else None
+
+    def _record(self, script: str):
+        if self._checker:
+            self._checker.check(script)
+        self.calls += 1
+        self.bytes += len(script.encode())
+        if self.keep:
+            self.recorded.append(script)
+
+    def _request(self, script: str) -> Future:
+        # nothing is run, so returned scripts are recorded and resolve to None
+        self.run_script(script)
+        future = Future()
+        future.set_result(None)
+        return future
+
+    def reset(self):
+        """
+        Clears the recorded scripts and counts.
+        """
+        self.recorded.clear()
+        self.calls = self.bytes = 0
+
+
+class _SyntaxChecker:
+    _source = '''
+        const vm = require('vm')
+        require('readline').createInterface({input: process.stdin}).on('line', (line) => {
+            try {
+                new vm.Script(JSON.parse(line))
+                console.log('')
+            } catch (e) {
+                console.log(JSON.stringify(String(e)))
+            }
+        })
+    '''
+    _process = None
+
+    def __init__(self):
+        node = shutil.which('node')
+        if node is None:
+            raise FileNotFoundError('node was not found, and must be installed to check the syntax of scripts.')
+        self._process = subprocess.Popen(
+            [node, '-e', self._source], stdin=subprocess.PIPE, stdout=subprocess.PIPE, text=True, encoding='utf-8')
+
+    def check(self, script: str):
+        self._process.stdin.write(json.dumps(script) + '\n')
+        self._process.stdin.flush()
+        error = self._process.stdout.readline().strip()
+        if error:
+            raise SyntaxError(f"\n\nscript -> '{script}',\nerror -> {json.loads(error)}")
+
+    def __del__(self):
+        if self._process:
+            self._process.kill()
+
+
+class RecordingChart(abstract.AbstractChart):
+    """
+    A chart without a GUI, recording the scripts it would run in `win` (a `NullWindow`).
+    """
+    def __init__(self, inner_width: float = 1.0, inner_height: float = 1.0, scale_candles_only: bool = False,
+                 toolbox: bool = False, check_syntax: bool = False, keep: bool = True):
+        super().__init__(NullWindow(check_syntax, keep), inner_width, inner_height, scale_candles_only, toolbox)
+        self.win.on_js_load()
+
+
 class StaticLWC(abstract.AbstractChart):
     def __init__(self, width=None, height=None, inner_width=1, inner_height=1,
                  scale_candles_only: bool = False, toolbox=False, autosize=True):
@@ -136,7 +224,7 @@ class StaticLWC(abstract.AbstractChart):
         self.width = width
         self.height = height
 
-    def run_script(self, script, run_last=False):
+    def run_script(self, script, run_last=False, key=None):
         if run_last:
             self.win.final_scripts.append(script)
         else:
@@ -365,4 +365,31 @@ export class Handler {
             rootStyle.setProperty(property, styles[valueKey]);
         }
     }
+
+    // Rebuilds bar objects from the columnar payloads sent by python, skipping null cells.
+    public static fromColumns(columns: {[key: string]: ArrayLike<any>}) {
+        const keys = Object.keys(columns)
+        const length = keys.length ? columns[keys[0]].length : 0
+        const data = new Array(length)
+        for (let i = 0; i < length; i++) {
+            const point: any = {}
+            for (const key of keys) {
+                const value = columns[key][i]
+                if (value !== null && value === value) point[key] = value
+            }
+            data[i] = point
+        }
+        return data
+    }
+
+    // Decodes base64 float64 buffers without parsing each number, NaN marking a missing cell.
+    public static fromBinary(buffers: {[key: string]: string}, columns: {[key: string]: ArrayLike<any>} = {}) {
+        for (const [key, encoded] of Object.entries(buffers)) {
+            const binary = atob(encoded)
+            const bytes = new Uint8Array(binary.length)
+            for (let i = 0; i < binary.length; i++) bytes[i] = binary.charCodeAt(i)
+            columns[key] = new Float64Array(bytes.buffer)
+        }
+        return Handler.fromColumns(columns)
+    }
 }
@@ -1,7 +1,28 @@
+import asyncio
+import json
+import os
+import shutil
+import struct
+import subprocess
+import time
 import unittest
+from base64 import b64decode
+from concurrent.futures import Future
+from queue import Queue
+from types import SimpleNamespace
+
+import numpy as np
 import pandas as pd
-from util import BARS, Tester
-from lightweight_charts import Chart
+try:
+    import pyarrow as pa
+except ImportError:
+    pa = None
+
+from lightweight_charts import Chart, RecordingChart, ServerChart
+from lightweight_charts.abstract import COMMANDS, Window
+from lightweight_charts.chart import PyWV, SharedMemoryReader, WebviewHandler, WindowQueues
+from lightweight_charts.util import binary_columns, js_binary, js_columns, parse_event_messages
+from util import BARS, Tester, make_bars
 
 
 class TestChart(Tester):
@@ -16,6 +37,612 @@ class TestChart(Tester):
         self.assertEqual(result0, self.chart.lines()[0])
         self.assertEqual(result1, self.chart.lines()[1])
 
+    def test_columns_are_serialized_without_nan(self):
+        df = pd.DataFrame({'time': [1, 2, 3], 'value': [1.5, np.nan, 2.0], 'color': ['red', None, 'blue']})
+        result = json.loads(js_columns(df))
+        self.assertEqual(result, {'time': [1, 2, 3], 'value': [1.5, None, 2.0], 'color': ['red', None, 'blue']})
+
+    def test_binary_columns_are_float64_buffers(self):
+        df = pd.DataFrame({'time': [1, 2], 'value': [1.5, np.nan], 'color': ['red', 'blue']})
+        buffers, columns = binary_columns(df)
+        self.assertEqual(np.frombuffer(b64decode(buffers['time']), '<f8').tolist(), [1.0, 2.0])
+        self.assertTrue(np.isnan(np.frombuffer(b64decode(buffers['value']), '<f8')[1]))
+        self.assertEqual(columns, {'color': ['red', 'blue']})
+        self.assertTrue(js_binary(df).startswith('Lib.Handler.fromBinary({"time":"'))
+
+    def test_set_sends_columnar_data(self):
+        self.chart.set(BARS)
+        script = next(s for s in self.chart.win.scripts if '.series.setData(' in s)
+        self.assertIn('.series.setData(Lib.Handler.fromColumns({"', script)
+
+    def test_update_appends_to_candle_data(self):
+        new_bars = []
+        self.chart.events.new_bar += lambda c: new_bars.append(c.candle_data.iloc[-1]['close'])
+        self.chart.set(BARS.iloc[:-2])
+        self.chart.update(BARS.iloc[-2])
+        self.chart.update(BARS.iloc[-1])
+        self.chart.update(BARS.iloc[-1].replace(BARS.iloc[-1]['close'], 1.0))
+        self.assertEqual(len(self.chart.candle_data), len(BARS))
+        self.assertEqual(self.chart.candle_data.iloc[-1]['close'], 1.0)
+        self.assertEqual(new_bars, [BARS.iloc[-2]['close'], BARS.iloc[-1]['close']])
+
+    def test_candle_data_is_read_only(self):
+        self.chart.set(BARS)
+        with self.assertRaises(ValueError):
+            self.chart.candle_data.loc[len(BARS) - 1, 'close'] = -1
+        self.assertEqual(self.chart._store.last()['close'], BARS['close'].iloc[-1])
+
+    def test_update_many_matches_update(self):
+        new_bars = []
+        self.chart.events.new_bar += lambda c: new_bars.append(c.candle_data.iloc[-1]['close'])
+        self.chart.set(BARS.iloc[:-10])
+        self.chart.update_many(BARS.iloc[-11:])
+        self.assertEqual(new_bars, BARS['close'].iloc[-10:].tolist())
+        self.assertEqual(self.chart.candle_data['close'].tolist(), BARS['close'].tolist())
+        self.assertEqual(sum('.series.update(bar)' in s for s in self.chart.win.scripts), 1)
+
+    def test_update_many_rejects_earlier_bars(self):
+        self.chart.set(BARS.iloc[:-10])
+        with self.assertRaises(ValueError):
+            self.chart.update_many(BARS.iloc[-10:].iloc[::-1])
+        with self.assertRaises(ValueError):
+            self.chart.update_many(BARS.iloc[-20:-15])
+        self.assertEqual(len(self.chart.candle_data), len(BARS) - 10)
+
+    def test_update_from_ticks_aggregates_bars(self):
+        self.chart.set(make_bars(volume=10.0))
+        ticks = pd.DataFrame({
+            'time': pd.date_range('2024-01-01 00:02:30', periods=4, freq='20s'),
+            'price': [3.0, 0.1, 4.0, 5.0],
+            'volume': 1.0,
+        })
+        self.chart.update_from_ticks(ticks, cumulative_volume=True)
+        bars = self.chart.candle_data
+        self.assertEqual(len(bars), 4)
+        self.assertEqual(bars.iloc[-2][['open', 'high', 'low', 'close', 'volume']].tolist(), [1.0, 3.0, 0.1, 0.1, 12.0])
+        self.assertEqual(bars.iloc[-1][['open', 'high', 'low', 'close', 'volume']].tolist(), [4.0, 5.0, 4.0, 5.0, 2.0])
+
+    def test_update_from_tick_matches_update_from_ticks(self):
+        bars = make_bars(volume=10.0)
+        ticks = pd.DataFrame({'time': pd.date_range('2024-01-01 00:02:30', periods=50, freq='7s'), 'price': np.linspace(0, 5, 50), 'volume': 1.0})
+        other = Chart()
+        self.chart.set(bars)
+        other.set(bars)
+        for _, tick in ticks.iterrows():
+            self.chart.update_from_tick(tick, cumulative_volume=True)
+        other.update_from_ticks(ticks, cumulative_volume=True)
+        self.assertTrue(np.allclose(self.chart.candle_data.to_numpy(float), other.candle_data.to_numpy(float)))
+
+    def test_update_from_ticks_rejects_unsorted_batches(self):
+        self.chart.set(make_bars())
+        ticks = pd.DataFrame({'time': pd.to_datetime(['2024-01-01 00:03:10', '2024-01-01 00:02:50']), 'price': [1.0, 2.0]})
+        with self.assertRaises(ValueError):
+            self.chart.update_from_ticks(ticks)
+        self.chart.update_from_ticks(ticks.iloc[::-1])
+        self.assertEqual(self.chart.candle_data['time'].dtype.kind, 'i')
+
+    def test_unchanged_tick_is_not_sent(self):
+        self.chart.set(make_bars())
+        script_count = len(self.chart.win.scripts)
+        self.chart.update_from_tick(pd.Series({'time': pd.Timestamp('2024-01-01 00:02:10'), 'price': 1.5}))
+        self.assertEqual(len(self.chart.win.scripts), script_count)
+
+    def test_update_rate_coalesces_updates(self):
+        self.chart.set(make_bars())
+        sent = []
+        self.chart.win.script_func = sent.append
+        self.chart.win.loaded = True
+        self.chart.set_update_rate(hz=1)
+        for price in (1.6, 1.7, 1.8):
+            self.chart.update_from_tick(pd.Series({'time': pd.Timestamp('2024-01-01 00:02:10'), 'price': price}))
+        self.chart.update_from_tick(pd.Series({'time': pd.Timestamp('2024-01-01 00:03:10'), 'price': 1.9}))
+        self.assertEqual(sent, [])
+        self.chart.win.flush_updates()
+        self.assertEqual(len(sent), 1)
+        self.assertEqual(sent[0].count(f'lwc({list(COMMANDS).index("update")},'), 2)
+        self.assertIn('"close":1.8', sent[0])
+
+    def test_update_rate_uses_schedule_func(self):
+        sent, scheduled = [], []
+        win = Window(sent.append, schedule_func=lambda delay, func: scheduled.append((delay, func)))
+        win.loaded = True
+        win.set_update_rate(10)
+        win.run_script('a', key=('a', 'update'))
+        win.run_script('b', key=('a', 'update'))
+        self.assertEqual((sent, [delay for delay, _ in scheduled]), ([], [0.1]))
+        scheduled[0][1]()
+        self.assertEqual(sent, ['b'])
+
+    def test_auto_batch_flushes_each_loop_iteration(self):
+        sent = []
+        win = Window(sent.append)
+        win.loaded = True
+        win._return_q = Queue()
+        win.auto_batch()
+
+        async def main():
+            win.run_script('a')
+            win.run_script('b')
+            self.assertEqual(sent, [])
+            await asyncio.sleep(0)
+            self.assertEqual(sent, ['a\nb'])
+            win.run_script('c')
+            request = asyncio.ensure_future(win.run_script_and_get_async('d'))
+            await asyncio.sleep(0)
+            self.assertEqual(sent[1], 'c')
+            self.assertTrue(sent[2].startswith('_~_~RETURN~_~_') and sent[2].endswith('_~_d'))
+            win._return_q.put((int(sent[2][14:].split('_~_')[0]), True))
+            self.assertTrue(await request)
+
+        asyncio.run(main())
+        win._return_q.put(None)
+        win.auto_batch(max_bytes=3)
+        win.run_script('ef')
+        win.run_script('gh')
+        self.assertEqual(sent[-1], 'ef\ngh')
+
+    def test_responses_are_matched_to_requests(self):
+        sent = []
+        win = Window(sent.append)
+        win.loaded = True
+        win._return_q = Queue()
+
+        async def main():
+            first = asyncio.ensure_future(win.run_script_and_get_async('1 + 1'))
+            second = asyncio.ensure_future(win.run_script_and_get_async('2 + 2'))
+            await asyncio.sleep(0)
+            ids = [int(script[14:].split('_~_')[0]) for script in sent]
+            win._return_q.put((ids[1], 4))
+            win._return_q.put((ids[0], 2))
+            return await asyncio.wait_for(asyncio.gather(first, second), 5)
+
+        self.assertEqual(asyncio.run(main()), [2, 4])
+        win._return_q.put(None)
+
+    def test_interval_is_inferred_and_shared_with_lines(self):
+        df = make_bars(20_000, '1h', '2024-01-01 09:30', volume=1.0, sma=1.0)
+        line = self.chart.create_line('sma')
+        self.chart.set(df)
+        self.assertEqual((self.chart._interval, self.chart.offset), (3600, 1800))
+        self.assertEqual((line._interval, line.offset), (3600, 1800))
+
+    def test_explicit_interval_skips_inference(self):
+        df = make_bars(10)
+        self.chart.set(df, interval='5min', offset=60)
+        self.assertEqual((self.chart._interval, self.chart.offset), (300, 60))
+        self.chart.set(df, interval=np.int64(86400))
+        self.assertEqual(self.chart._interval, 86400)
+
+    def test_normalized_frame_is_not_copied(self):
+        df = make_bars(time=np.arange(1_700_000_000, 1_700_000_000 + 600 * 60, 60), volume=1.0)
+        self.assertIs(self.chart._df_datetime_format(df), df)
+        self.chart.set(df, copy=False)
+        self.assertEqual(self.chart._interval, 60)
+        self.assertTrue(np.shares_memory(self.chart.candle_data['close'].to_numpy(), df['close'].to_numpy()))
+        self.chart.update(pd.Series({'time': pd.Timestamp(df['time'].iloc[-1], unit='s'), 'open': 1, 'high': 3, 'low': 1, 'close': 3}))
+        self.assertEqual(df['close'].iloc[-1], 1.5)
+        self.assertEqual(self.chart.candle_data['close'].iloc[-1], 3)
+
+    def test_integer_times_do_not_depend_on_labels(self):
+        times = np.arange(1_700_000_000, 1_700_000_000 + 600 * 60, 60)
+        for df in (make_bars(time=times, SMA=1.0), make_bars(time=times.astype('int32'))):
+            self.chart.set(df)
+            self.assertEqual(self.chart.candle_data['time'].iloc[:2].tolist(), [1_700_000_000, 1_700_000_060])
+            self.assertEqual(self.chart._interval, 60)
+
+    def test_structured_array_is_set_without_pandas_copy(self):
+        bars = make_bars(time=np.arange(1_700_000_000, 1_700_000_000 + 600 * 60, 60), volume=1.0)
+        array = bars.to_records(index=False)
+        self.chart.set(array)
+        self.assertEqual(self.chart.candle_data['time'].tolist(), bars['time'].tolist())
+        self.assertEqual(self.chart._interval, 60)
+
+    def test_lod_line_sends_decimated_range(self):
+        def sent_points():
+            script = self.chart.win.scripts[-1]
+            start = script.index('fromColumns(') + len('fromColumns(')
+            return json.loads(script[start:script.index(')', start)])['time']
+
+        times = np.arange(1_700_000_000, 1_700_000_000 + 100_000 * 60, 60)
+        line = self.chart.create_line('value', lod_points=1000)
+        line.set(pd.DataFrame({'time': times, 'value': np.sin(np.arange(100_000) / 500)}))
+        self.assertLessEqual(len(sent_points()), 1000)
+        self.assertEqual(len(line.data), 100_000)
+
+        self.chart.win.handlers[f'{line.id}_lod'](str(times[5000]), str(times[5499]))
+        points = sent_points()
+        self.assertTrue(set(times[5000:5500].tolist()) <= set(points))
+        self.assertIn('setVisibleRange', self.chart.win.scripts[-1])
+        script_count = len(self.chart.win.scripts)
+        self.chart.win.handlers[f'{line.id}_lod'](str(times[5000]), str(times[5499]))
+        self.assertEqual(len(self.chart.win.scripts), script_count)
+
+    def test_history_loader_prepends_pages(self):
+        history, ends = make_bars(1000, volume=1.0), []
+
+        def loader(end):
+            ends.append(end)
+            return history[history['time'] < end].iloc[-100:]
+
+        self.chart.set(history.iloc[-100:])
+        self.chart.set_history_loader(loader)
+        handler = self.chart.win.handlers[f'{self.chart.id}_history']
+        handler(50, 0)
+        self.assertEqual(len(self.chart.candle_data), 200)
+        self.assertIn('.concat(', self.chart.win.scripts[-1])
+        self.chart._history_next[1].result()
+        handler(40, 0)
+        self.assertEqual(len(self.chart.candle_data), 200)
+        handler(50, 1)
+        self.assertEqual(self.chart.candle_data['time'].tolist(), ((history['time'].iloc[-300:] - pd.Timestamp(0)) // pd.Timedelta('1s')).tolist())
+        self.chart._history_next[1].result()
+        self.assertEqual(ends, history['time'].iloc[[-100, -200, -300]].tolist())
+
+    def test_async_history_loader_stops_when_exhausted(self):
+        history = make_bars(150)
+
+        async def loader(end):
+            return history[history['time'] < end].iloc[-100:]
+
+        async def scroll():
+            self.chart.set(history.iloc[-100:])
+            self.chart.set_history_loader(loader, prefetch=False)
+            handler = self.chart.win.handlers[f'{self.chart.id}_history']
+            for generation in range(3):
+                await handler(50, generation)
+
+        asyncio.run(scroll())
+        self.assertEqual(len(self.chart.candle_data), 150)
+        self.assertTrue(self.chart._history_done)
+
+    def test_timeframes_are_derived_and_updated(self):
+        base = make_bars(60, volume=1.0)
+        base['close'] = np.arange(60.0)
+        self.chart.timeframes.set(base, '5min')
+        bars = self.chart.candle_data
+        self.assertEqual(len(bars), 12)
+        self.assertEqual(self.chart._interval, 300)
+        self.assertEqual(bars[['close', 'volume']].iloc[0].tolist(), [4.0, 5.0])
+
+        self.chart.timeframes.update(pd.Series({'time': pd.Timestamp('2024-01-01 01:00'), 'open': 1.0, 'high': 9.0, 'low': 0.5, 'close': 60.0, 'volume': 1.0}))
+        self.chart.timeframes.update_from_tick(pd.Series({'time': pd.Timestamp('2024-01-01 01:01:30'), 'price': 61.0, 'volume': 2.0}))
+        self.assertEqual(self.chart.candle_data[['high', 'close', 'volume']].iloc[-1].tolist(), [61.0, 61.0, 3.0])
+
+        self.chart.timeframes.show('15min')
+        self.assertEqual(self.chart.candle_data['close'].tolist(), [14.0, 29.0, 44.0, 59.0, 61.0])
+        self.chart.timeframes.show('5min')
+        self.assertEqual(len(self.chart.candle_data), 13)
+
+    def test_timeframe_cache_evicts_least_recently_used(self):
+        self.chart.timeframes.max_bytes = 1
+        self.chart.timeframes.set(make_bars(60), '5min')
+        self.chart.timeframes.show('15min')
+        self.assertEqual(list(self.chart.timeframes._cache), [900])
+
+    def test_callbacks_are_drained_from_the_pipe(self):
+        received = []
+        self.chart.win.handlers['pump_test'] = lambda *args: received.append(args)
+        send = Chart.WV._emit_send
+        send.send('pump_test_~_a;;;b')
+        send.send('pump_test_~_c')
+        send.send('exit')
+        asyncio.run(asyncio.wait_for(self.chart._handle_callbacks(), 5))
+        self.assertEqual(received, [('a', 'b'), ('c',)])
+        self.assertFalse(self.chart.is_alive)
+
+    def test_callbacks_stop_when_exited_from_another_task(self):
+        async def exit_later():
+            await asyncio.sleep(0.05)
+            self.chart.exit()
+
+        async def main():
+            await asyncio.gather(self.chart._handle_callbacks(), exit_later())
+
+        asyncio.run(asyncio.wait_for(main(), 5))
+        self.assertFalse(self.chart.is_alive)
+
+    def test_large_scripts_pass_through_reused_shared_memory(self):
+        handler = WebviewHandler()
+        handler.shared_memory_threshold = 16
+        reader = SharedMemoryReader(handler.free_segment_queue)
+        try:
+            handler.create_window(800, 600, None, None)
+            function_call_queue = handler.workers[0].queue
+            function_call_queue.get(timeout=5)
+            handler.evaluate_js(0, 'short')
+            self.assertEqual(function_call_queue.get(timeout=5), (0, 'short'))
+            handler.evaluate_js(0, 'a' * 1000)
+            i, handle = function_call_queue.get(timeout=5)
+            reader.segments.update(handler._segments)
+            self.assertEqual(reader.read(handle), 'a' * 1000)
+            while handler.free_segment_queue.empty():
+                time.sleep(0.01)
+            handler.evaluate_js(0, 'b' * 500)
+            _, reused = function_call_queue.get(timeout=5)
+            self.assertEqual(reused[1], handle[1])
+            self.assertEqual(reader.read(reused), 'b' * 500)
+        finally:
+            handler.exit()
+        self.assertEqual(handler._segments, {})
+
+    def test_small_scripts_of_other_windows_go_first(self):
+        queues = WindowQueues()
+        queues.bulk_size = 10
+        queues.put((0, 'x' * 100))
+        queues.put((0, 'after bulk'))
+        queues.put((1, 'tick'))
+        queues.put(('create_window', ()))
+        queues.put((1, 'show'))
+        self.assertEqual([queues.get() for _ in range(5)], [
+            ('create_window', ()), (1, 'tick'), (1, 'show'), (0, 'x' * 100), (0, 'after bulk')
+        ])
+
+    def test_stale_keyed_scripts_are_dropped(self):
+        queues = WindowQueues()
+        queues.put((0, 'first', ('a', 1)))
+        queues.put((0, 'other', ('b', 1)))
+        queues.put((0, 'second', ('a', 1)))
+        queues.put((0, 'unkeyed'))
+        queues.put((0, 'third', ('a', 1)))
+        self.assertEqual([queues.get()[1] for _ in range(4)], ['other', 'second', 'unkeyed', 'third'])
+
+    def test_keys_are_passed_to_script_func(self):
+        sent = []
+        win = Window(lambda script, key=None: sent.append((script, key)), script_keys=True)
+        win.loaded = True
+        win.run_script('a', key=('series', 'update', 1))
+        win.run_script('b')
+        self.assertEqual(sent, [('a', ('series', 'update', 1)), ('b', None)])
+
+    def test_scripts_are_run_without_waiting_for_results(self):
+        calls = []
+        window = SimpleNamespace(run_js=lambda s: calls.append(('run_js', s)),
+                                 evaluate_js=lambda s: calls.append(('evaluate_js', s)))
+        PyWV.run_js(SimpleNamespace(debug=False), window, 'let a = 1', 'let a = 2')
+        PyWV.run_js(SimpleNamespace(debug=True), window, 'let a = 1')
+        self.assertEqual(calls, [('run_js', '{\nlet a = 1\n}\n{\nlet a = 2\n}'), ('evaluate_js', 'let a = 1')])
+
+    def test_queued_scripts_of_a_window_are_taken_together(self):
+        queues = WindowQueues()
+        queues.bulk_size = 10
+        for arg in ('a', 'b', 'c' * 8, 'd', 'show', 'e'):
+            queues.put((0, arg))
+        queues.put((1, 'f'))
+        self.assertEqual(queues.get(), (0, 'a'))
+        self.assertEqual(queues.take_scripts(0, 1), ['b', 'c' * 8])
+        self.assertEqual(queues.take_scripts(0, 0), ['d'])
+        self.assertEqual([queues.get() for _ in range(3)], [(1, 'f'), (0, 'show'), (0, 'e')])
+
+    def test_spare_windows_are_configured_for_new_charts(self):
+        handler = WebviewHandler()
+        try:
+            handler.spare_windows.append(handler._new_window((800, 600, None, None, None, False, False, '', True)))
+            self.assertEqual(handler.create_window(300, 200, 10, 20, title='spare'), 0)
+            self.assertEqual(handler.create_window(300, 200, 10, 20), 1)
+            function_call_queue = handler.workers[0].queue
+            self.assertEqual(function_call_queue.get(timeout=5)[0], 'create_window')
+            self.assertEqual(function_call_queue.get(timeout=5),
+                             ('configure_window', (0, 300, 200, 10, 20, None, False, False, 'spare')))
+            self.assertEqual(function_call_queue.get(timeout=5)[0], 'create_window')
+        finally:
+            handler.exit()
+
+    def test_windows_are_shared_between_processes(self):
+        handler = WebviewHandler(processes=2)
+        try:
+            windows = [handler.create_window(800, 600, None, None) for _ in range(3)]
+            self.assertEqual(windows, [0, 1, 2])
+            self.assertEqual([worker.windows for worker in handler.workers], [2, 1])
+            handler.evaluate_js(1, 'script')
+            handler.show(2)
+            first, second = (worker.queue for worker in handler.workers)
+            self.assertEqual([second.get(timeout=5) for _ in range(2)][1], (0, 'script'))
+            self.assertEqual([first.get(timeout=5) for _ in range(3)][2], (1, 'show'))
+        finally:
+            handler.exit()
+
+    def test_recording_chart_counts_scripts(self):
+        chart = RecordingChart()
+        chart.win.reset()
+        chart.set(make_bars(10))
+        chart.update(pd.Series({'time': pd.Timestamp('2024-01-01 00:10'), 'open': 1, 'high': 2, 'low': 0, 'close': 1}))
+        self.assertEqual(chart.win.calls, len(chart.win.recorded))
+        self.assertEqual(chart.win.bytes, sum(len(script.encode()) for script in chart.win.recorded))
+        self.assertTrue(chart.win.recorded[-1].startswith(f'lwc({list(COMMANDS).index("update")},'))
+        self.assertIsNone(chart.win.run_script_and_get('1 + 1'))
+
+    @unittest.skipIf(shutil.which('node') is None, 'node is not installed')
+    def test_recording_chart_checks_syntax(self):
+        chart = RecordingChart(toolbox=True, check_syntax=True)
+        chart.set(make_bars(10, volume=1.0))
+        chart.create_line('value').set(make_bars(3).rename(columns={'close': 'value'}))
+        chart.marker(text='marker')
+        chart.horizontal_line(1.5)
+        with self.assertRaises(SyntaxError):
+            chart.run_script('let = ;')
+
+    def test_commands_send_only_arguments(self):
+        chart = RecordingChart()
+        chart.topbar.textbox('label', 'a')
+        line = chart.horizontal_line(1.0)
+        chart.win.reset()
+        chart.topbar['label'].set('say "hi"')
+        line.update(np.float64(2.5))
+        index = list(COMMANDS).index
+        self.assertEqual(chart.win.recorded, [
+            f'lwc({index("set_text")},"{chart.topbar["label"].id[7:]}","say \\"hi\\"")',
+            f'lwc({index("update_points")},"{line.id[7:]}",{{"price":2.5}})',
+        ])
+
+    @unittest.skipIf(shutil.which('node') is None, 'node is not installed')
+    def test_commands_run_on_their_targets(self):
+        win = Window(lambda script: None)
+        registration = win.scripts[0]
+        win.run_command('set_text', 'window.widget', 'text')
+        result = subprocess.run(['node', '-e', f'''
+            window = globalThis
+            window.widget = {{}}
+            {registration}
+            {win.scripts[-1]}
+            console.log(window.widget.innerText)
+        '''], capture_output=True, text=True)
+        self.assertEqual(result.stdout.strip(), 'text')
+
+    @unittest.skipIf(shutil.which('node') is None, 'node is not installed')
+    def test_events_are_batched_and_throttled(self):
+        win = Window(lambda script: None)
+        result = subprocess.run(['node', '-e', f'''
+            window = globalThis
+            window.document = {{hidden: false}}
+            window.requestAnimationFrame = (func) => setTimeout(func, 16)
+            window.callbackFunction = (message) => console.log(message)
+            {win.scripts[0]}
+            lwcEvents.rates.slow = {{throttle: 100}}
+            lwcEmit('click', [1, 2])
+            lwcEmit('range', [0, 10], true)
+            lwcEmit('click', [3, null])
+            lwcEmit('range', [0, 20], true)
+            for (let i = 0; i < 5; i++) lwcEmit('slow', [i], true)
+            setTimeout(() => {{ lwcEmit('slow', [5], true); lwcEmit('slow', [6], true) }}, 20)
+        '''], capture_output=True, text=True)
+        self.assertEqual([json.loads(line) for line in result.stdout.split()], [
+            [['click', [1, 2]], ['range', [0, 20]], ['click', [3, None]], ['slow', [4]]],
+            [['slow', [6]]],
+        ])
+
+    def test_batched_and_single_events_are_parsed(self):
+        win = Window()
+        win.handlers = {'a': print, 'b': len}
+        self.assertEqual(parse_event_messages(win, 'a_~_1;;;2'), [(print, ['1', '2'])])
+        self.assertEqual(parse_event_messages(win, '[["a", [1, null]], ["b", []]]'), [(print, [1, None]), (len, [])])
+
+    def test_server_chart_replays_and_broadcasts_scripts(self):
+        chart = ServerChart(port=0)
+        chart.set(make_bars())
+        chart.show()
+        received = Queue()
+        chart.win.handlers['server_test'] = lambda *args: received.put(args)
+
+        async def read_script(reader):
+            first, second = await reader.readexactly(2)
+            length = second & 0x7F
+            if length == 126:
+                length, = struct.unpack('!H', await reader.readexactly(2))
+            elif length == 127:
+                length, = struct.unpack('!Q', await reader.readexactly(8))
+            self.assertEqual(first, 0x82)
+            return (await reader.readexactly(length)).decode()
+
+        async def client():
+            reader, writer = await asyncio.open_connection('127.0.0.1', chart.port)
+            writer.write(b'GET / HTTP/1.1\r\n\r\n')
+            self.assertIn(b'lwcSocket', await reader.read())
+            writer.close()
+
+            reader, writer = await asyncio.open_connection('127.0.0.1', chart.port)
+            writer.write(b'GET /ws HTTP/1.1\r\nUpgrade: websocket\r\nConnection: Upgrade\r\n'
+                         b'Sec-WebSocket-Key: dGhlIHNhbXBsZSBub25jZQ==\r\nSec-WebSocket-Version: 13\r\n\r\n')
+            response = await reader.readuntil(b'\r\n\r\n')
+            self.assertIn(b's3pPLMBiTxaQ9kYGzzhZRbK+xOo=', response)
+            scripts = [await read_script(reader) for _ in range(len(chart._snapshot))]
+            self.assertTrue(any('setData' in script for script in scripts))
+
+            chart.update(pd.Series({'time': pd.Timestamp('2024-01-01 00:03'), 'open': 1, 'high': 2, 'low': 0, 'close': 1}))
+            self.assertIn(f'lwc({list(COMMANDS).index("update")},', await read_script(reader))
+
+            mask, payload = os.urandom(4), b'server_test_~_a;;;b'
+            writer.write(bytes([0x81, 0x80 | len(payload)]) + mask + bytes(b ^ mask[i % 4] for i, b in enumerate(payload)))
+            await writer.drain()
+            writer.close()
+
+        try:
+            asyncio.run(asyncio.wait_for(client(), 5))
+            self.assertEqual(received.get(timeout=5), ('a', 'b'))
+        finally:
+            chart.exit()
+
+    def test_server_chart_snapshot_keeps_last_keyed_script(self):
+        chart = ServerChart(port=0)
+        chart.set(make_bars())
+        for close in (1.6, 1.7):
+            chart.update(pd.Series({'time': pd.Timestamp('2024-01-01 00:02'), 'open': 1, 'high': 2, 'low': 0, 'close': close}))
+        updates = [script for script in chart._snapshot.values() if script.startswith('lwc(')]
+        self.assertEqual(len(updates), 1)
+        self.assertIn('"close":1.7', updates[0])
+
+    def test_server_chart_snapshot_drops_scripts_superseded_by_set(self):
+        chart = ServerChart(port=0)
+        chart.set(make_bars())
+        size = len(chart._snapshot)
+        start = pd.Timestamp('2024-01-01 00:03')
+        for i in range(100):
+            chart.update_from_tick(pd.Series({'time': start + pd.Timedelta(seconds=30 * i), 'price': 1.0 + i % 7}))
+            chart.marker(start + pd.Timedelta(seconds=30 * i))
+        chart.update_many(pd.DataFrame({'time': [start + pd.Timedelta(hours=1)], 'open': 1, 'high': 2, 'low': 0, 'close': 1}))
+        self.assertEqual(len(chart._snapshot), size + 52)
+        chart.set(make_bars())
+        self.assertEqual(len(chart._snapshot), size + 1)
+        self.assertEqual(sum('setMarkers' in script for script in chart._snapshot.values()), 1)
+        with self.assertRaises(NotImplementedError):
+            chart.screenshot()
+
+    def test_superseded_scripts_are_not_loaded(self):
+        sent = []
+        self.chart.set(make_bars(5, volume=1.0))
+        self.chart.grid(color='red')
+        self.chart.update(make_bars(6, volume=1.0).iloc[-1])
+        self.chart.set(make_bars(3, volume=2.0))
+        self.chart.grid(color='blue')
+        self.chart.win.script_func = sent.append
+        self.chart.win._return_q = None     # skips waiting for the page
+        self.chart.win.on_js_load()
+        self.assertEqual(len(sent), 1)
+        self.assertEqual(sent[0].count('.series.setData('), 1)
+        self.assertEqual(sent[0].count('.volumeSeries.setData('), 1)
+        self.assertNotIn('"red"', sent[0])
+        self.assertNotIn(f'lwc({list(COMMANDS).index("update")},', sent[0])
+        self.assertIn('"blue"', sent[0])
+        self.assertLess(sent[0].index('.series.setData('), sent[0].index('"blue"'))
+
+    def test_js_load_asks_again_until_the_document_is_complete(self):
+        requests = []
+        win = Window(lambda script: None)
+        win._return_q = Queue()
+        answers = [Future(), Future(), Future()]     # the first is never answered
+        answers[1].set_result(False)
+        answers[2].set_result(True)
+        win._request = lambda script: requests.append(script) or answers[len(requests) - 1]
+        win._wait_for_document(timeout=0.01)
+        self.assertEqual(len(requests), 3)
+        self.assertTrue(all('readyState' in request for request in requests))
+
+    def test_pending_update_moves_after_scripts_it_follows(self):
+        win = Window(lambda script: None)
+        win.loaded, win._update_interval = True, 1
+        win._schedule_updates = lambda: None
+        win.run_script('grid 1', key=('chart', 'grid'))
+        win.run_script('price line', key=('series', 'price_line'))
+        win.run_script('grid 2', key=('chart', 'grid'))
+        self.assertEqual(list(win._pending_updates.values()), ['price line', 'grid 2'])
+
+    def test_pending_set_drops_the_updates_of_its_series(self):
+        win = Window(lambda script: None)
+        win.loaded, win._update_interval = True, 1
+        win._schedule_updates = lambda: None
+        win.run_script('set 1', key=('series', 'setData'))
+        win.run_script('update', key=('series', 'update', 1))
+        win.run_script('other update', key=('other', 'update', 1))
+        win.run_script('set 2', key=('series', 'setData'))
+        self.assertEqual(list(win._pending_updates.values()), ['other update', 'set 2'])
+
+    @unittest.skipIf(pa is None, 'pyarrow is not installed')
+    def test_arrow_table_matches_dataframe(self):
+        bars = make_bars(10, volume=1.0)
+        other = Chart()
+        self.chart.set(bars)
+        other.set(pa.Table.from_pandas(bars))
+        self.assertTrue(self.chart.candle_data.equals(other.candle_data))
+
 
 if __name__ == '__main__':
     unittest.main()
\ No newline at end of file
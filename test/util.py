@@ -7,6 +7,16 @@ from lightweight_charts import Chart
 BARS = pd.read_csv('../examples/1_setting_data/ohlcv.csv')
 
 
+def make_bars(periods: int = 3, freq: str = '1min', start: str = '2024-01-01', **columns) -> pd.DataFrame:
+    """
+    Bars of constant prices, with any extra columns (or a 'time' column replacing the date range).
+    """
+    times = columns.pop('time', None)
+    if times is None:
+        times = pd.date_range(start, periods=periods, freq=freq)
+    return pd.DataFrame({'time': times, 'open': 1.0, 'high': 2.0, 'low': 0.5, 'close': 1.5, **columns})
+
+
 
 class Tester(unittest.TestCase):
     def setUp(self):